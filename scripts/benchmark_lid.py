@@ -0,0 +1,188 @@
+"""Measures lid sensor latency and idle wakeups with gpiozero's mock pins.
+
+    python3 scripts/benchmark_lid.py
+
+Compares the LidSensor edge events with the 100ms polling loop the state
+machine used before: time from the edge until the waiting thread
+continues, and how often the waiting thread wakes up while the lid does
+not move.
+
+Then checks the events: one edge gives one event, a bouncing contact
+gives one event as well and the edge latency stays under LATENCY_BOUND_MS.
+A wait whose edge got lost has to continue after LID_RECHECK_INTERVAL.
+gpiozero's mock pins ignore the bounce time, the check uses a pin which
+drops edges within it like RPi.GPIO does. Exits with 1 if a check fails.
+"""
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+from gpiozero import Button
+from gpiozero.pins.mock import MockFactory, MockPin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from const import LID_BOUNCE_TIME, LID_RECHECK_INTERVAL  # noqa: E402
+from LidSensor import CLOSED, OPENED, LidSensor  # noqa: E402
+
+PIN = 26
+SAMPLES = 50
+IDLE_SECONDS = 5
+LATENCY_BOUND_MS = 10  # median from the edge until the waiting thread continues
+
+
+class BouncingMockPin(MockPin):
+    """Mock pin which drops edges within the bounce time of the last one, like RPi.GPIO"""
+
+    def __init__(self, factory, number):
+        super().__init__(factory, number)
+        self._last_edge = None
+
+    def _call_when_changed(self, ticks=None, state=None):
+        now = time.monotonic()
+        if self._bounce is not None and self._last_edge is not None and now - self._last_edge < self._bounce:
+            return
+        self._last_edge = now
+        super()._call_when_changed(ticks, state)
+
+
+def poll_opened(button: Button) -> None:
+    """The loop of notify_state before the LidSensor"""
+    while True:
+        if not button.is_pressed:
+            return
+        time.sleep(0.1)
+
+
+def wakeups(thread_id: int) -> int:
+    with open(f"/proc/self/task/{thread_id}/status") as status:
+        for line in status:
+            if line.startswith("voluntary_ctxt_switches:"):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(wait_opened, pin) -> tuple:
+    """Returns (edge latencies in ms, wakeups per minute while idle)"""
+    latencies = []
+    for _ in range(SAMPLES):
+        pin.drive_low()  # lid closed
+        done = threading.Event()
+        continued_at = []
+
+        def waiter():
+            wait_opened()
+            continued_at.append(time.perf_counter())
+            done.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        # the waiter blocks before the edge arrives, at a random point of a polling period
+        time.sleep(random.uniform(0.02, 0.12))
+        edge_at = time.perf_counter()
+        pin.drive_high()  # lid opened
+        done.wait()
+        thread.join()
+        latencies.append((continued_at[0] - edge_at) * 1000)
+
+    pin.drive_low()
+    thread = threading.Thread(target=wait_opened)
+    thread.start()
+    time.sleep(0.1)
+    before = wakeups(thread.native_id)
+    time.sleep(IDLE_SECONDS)
+    idle = (wakeups(thread.native_id) - before) * 60 / IDLE_SECONDS
+    pin.drive_high()
+    thread.join()
+    return latencies, idle
+
+
+def report(name: str, latencies: list, idle: float) -> None:
+    latencies.sort()
+    print(
+        f"{name:>8}: edge to transition median {statistics.median(latencies):7.2f}ms, "
+        f"max {latencies[-1]:7.2f}ms, {idle:5.0f} wakeups/min while idle"
+    )
+
+
+def check(name: str, passed: bool) -> bool:
+    print(f"{'ok' if passed else 'FAILED':>6}  {name}")
+    return passed
+
+
+def edge_events(lid: LidSensor, drive) -> list:
+    """Events of the lid for the pin changes of drive(), after the last bounce time passed"""
+    time.sleep(LID_BOUNCE_TIME * 2)
+    while not lid.events.empty():
+        lid.events.get_nowait()
+    drive()
+    time.sleep(0.01)  # gpiozero calls back on the driving thread, this is only a margin
+    return [event for event, _ in list(lid.events.queue)]
+
+
+def lost_edge_delay(lid: LidSensor, pin) -> float:
+    """Seconds until wait_opened continues when the edge of the opening never arrives"""
+    pin.drive_low()
+    time.sleep(LID_BOUNCE_TIME * 2)
+    continued_at = []
+    thread = threading.Thread(target=lambda: continued_at.append(lid.wait_opened(LID_RECHECK_INTERVAL * 4)))
+    thread.start()
+    time.sleep(0.05)
+
+    callback = lid.button.when_deactivated
+    lid.button.when_deactivated = None  # the edge is lost
+    opened_at = time.monotonic()
+    pin.drive_high()
+    thread.join()
+    lid.button.when_deactivated = callback
+    return time.monotonic() - opened_at if continued_at == [True] else float("inf")
+
+
+def check_events(median_latency: float) -> list:
+    factory = MockFactory(pin_class=BouncingMockPin)
+    factory.reset()  # the mock factories share their pins, the measured ones are plain MockPins
+    lid = LidSensor(PIN, pin_factory=factory)
+    pin = factory.pin(PIN)
+    pin.drive_low()
+
+    def bounce():
+        for _ in range(3):
+            pin.drive_high()
+            pin.drive_low()
+
+    results = [
+        check("one edge gives one event", edge_events(lid, pin.drive_high) == [OPENED]),
+        check("a bouncing contact gives one event", edge_events(lid, bounce) == [CLOSED]),
+        check(
+            f"edge latency median {median_latency:.2f}ms under {LATENCY_BOUND_MS}ms",
+            median_latency < LATENCY_BOUND_MS,
+        ),
+    ]
+    delay = lost_edge_delay(lid, pin)
+    results.append(
+        check(
+            f"a lost edge delays the wait by {delay * 1000:.0f}ms, at most {LID_RECHECK_INTERVAL * 1000:.0f}ms",
+            delay <= LID_RECHECK_INTERVAL + 0.05,
+        )
+    )
+    lid.button.close()
+    return results
+
+
+if __name__ == "__main__":
+    factory = MockFactory()
+
+    # the debounce only drops edges after the first one, it adds no latency
+    lid = LidSensor(PIN, bounce_time=None, pin_factory=factory)
+    latencies, idle = measure(lid.wait_opened, factory.pin(PIN))
+    report("events", latencies, idle)
+    lid.button.close()
+
+    button = Button(PIN, pin_factory=factory)
+    report("polling", *measure(lambda: poll_opened(button), factory.pin(PIN)))
+    button.close()
+
+    sys.exit(0 if all(check_events(statistics.median(latencies))) else 1)
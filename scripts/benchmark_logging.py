@@ -0,0 +1,170 @@
+"""Compares the old synchronous logging with the LogPipeline.
+
+    python3 scripts/benchmark_logging.py
+
+Reports the time the state loop spends in the log calls of one poll
+cycle, and the writes to the log file in a simulated hour: a poll every
+minute, activity polling every 10s after each of six messages per hour.
+"""
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from LogPipeline import LogPipeline  # noqa: E402
+
+CYCLES = 5000
+RESPONSE = {
+    "message": {
+        "id": 42,
+        "text": "x" * 140,
+        "author": {"id": 7, "name": "Alex"},
+        "text_color": "white",
+        "background_color": "black",
+        "created_at": "2024-01-01T12:00:00Z",
+    },
+    "settings": {"fetch_interval": 60, "rotation_interval": 30, "rotation_count": 1, "mute": False},
+}
+
+
+class CountingStream:
+    """Counts the writes which reach the file"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.writes = 0
+
+    def write(self, text):
+        return self.stream.write(text)
+
+    def flush(self):
+        self.writes += 1
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def old_cycle():
+    logging.info("Current State: " + str("State.FETCH_MESSAGES"))
+    logging.info("Fetching messages...")
+    logging.info("Last message: " + json.dumps(RESPONSE))
+    logging.info("Next poll in %.1fs (%s)", 60.0, "interval")
+
+
+def new_cycle():
+    logging.info("Current State: %s", "State.FETCH_MESSAGES")
+    logging.info("Fetching messages...")
+    logging.info("Last message", extra={"fields": {"response": RESPONSE}})
+    logging.info("Next poll in %.1fs (%s)", 60.0, "interval")
+
+
+def message_cycle():
+    for text in ("Notify user...", "Rotating servo", "Box opend", "Sending reading request",
+                 "Waiting for box is closed", "Box closed!"):
+        logging.info(text)
+
+
+def reset_logging():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def old_setup(path):
+    reset_logging()
+    file_handler = RotatingFileHandler(path, maxBytes=25000000, backupCount=2)
+    logging.basicConfig(format="%(asctime)s [%(levelname)s] %(message)s", level=logging.DEBUG,
+                        datefmt="%y-%m-%d %H:%M:%S", handlers=[file_handler])
+    logging.getLogger().addHandler(logging.StreamHandler(open(os.devnull, "w")))
+    file_handler.stream = CountingStream(file_handler.stream)
+    return file_handler.stream, None
+
+
+def new_setup(path, sampled=True):
+    reset_logging()
+    pipeline = LogPipeline(path, stream=open(os.devnull, "w"))
+    if not sampled:
+        pipeline.sampler.burst = CYCLES * 10
+    target = pipeline.file_handler.target
+    target.stream = CountingStream(target._open())
+    pipeline.start()
+    return target.stream, pipeline
+
+
+def latency(cycle) -> list:
+    """Microseconds the calling thread spends per cycle"""
+    samples = []
+    for _ in range(CYCLES):
+        start = time.perf_counter()
+        cycle()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def simulated_hour(cycle, pipeline) -> None:
+    clock = [time.time()]
+    real_time = time.time
+    time.time = lambda: clock[0]
+    try:
+        def tick(seconds):
+            if pipeline is not None:
+                pipeline.queue.join()  # the writer sees the same clock as the records
+            clock[0] += seconds
+
+        elapsed = 0
+        while elapsed < 3600:
+            cycle()
+            if elapsed % 600 == 0:
+                message_cycle()
+                for _ in range(12):  # activity polling for 2 minutes
+                    cycle()
+                    tick(10)
+                    elapsed += 10
+            else:
+                tick(60)
+                elapsed += 60
+        if pipeline is not None:
+            pipeline.queue.join()
+    finally:
+        time.time = real_time
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        unsampled = lambda path: new_setup(path, sampled=False)  # noqa: E731
+        for name, setup, cycle in (
+            ("old", old_setup, old_cycle),
+            ("pipeline", new_setup, new_cycle),
+            ("unsampled", unsampled, new_cycle),
+        ):
+            stream, pipeline = setup(os.path.join(directory, name + "-latency.log"))
+            samples = latency(cycle)
+            queue_full = 0
+            if pipeline is not None:
+                pipeline.stop()
+                queue_full = pipeline.handler.dropped
+
+            stream, pipeline = setup(os.path.join(directory, name + "-hour.log"))
+            simulated_hour(cycle, pipeline)
+            dropped = 0
+            if pipeline is not None:
+                pipeline.stop()
+                dropped = pipeline.sampler.dropped
+            size = os.path.getsize(os.path.join(directory, name + "-hour.log"))
+
+            samples.sort()
+            print(
+                f"{name:>9}: log calls per cycle median {statistics.median(samples):6.1f}us, "
+                f"p99 {samples[int(len(samples) * 0.99)]:7.1f}us; "
+                f"{stream.writes:4d} file writes/hour, {size / 1024:5.1f}kB/hour, {dropped} records sampled out; "
+                f"{queue_full} dropped by the full queue while measuring the latency"
+            )
+        reset_logging()
@@ -0,0 +1,45 @@
+"""Measures the cost of one metrics sample, enabled and disabled.
+
+    python3 scripts/benchmark_metrics.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from Metrics import MetricsRegistry  # noqa: E402
+
+SAMPLES = 200000
+
+
+def per_sample(function) -> float:
+    """Nanoseconds per call"""
+    start = time.perf_counter()
+    for _ in range(SAMPLES):
+        function()
+    return (time.perf_counter() - start) / SAMPLES * 1e9
+
+
+def timed_block(registry: MetricsRegistry):
+    def sample():
+        with registry.timer("messagebox_state_seconds", state="FETCH_MESSAGES"):
+            pass
+
+    return sample
+
+
+if __name__ == "__main__":
+    baseline = per_sample(lambda: None)
+    for enabled in (False, True):
+        registry = MetricsRegistry()
+        registry.enabled = enabled
+        timer = per_sample(timed_block(registry)) - baseline
+        counter = per_sample(lambda: registry.inc("messagebox_servo_steps_total")) - baseline
+        state = "enabled" if enabled else "disabled"
+        print(f"{state:>8}: timer {timer:6.0f}ns, counter {counter:6.0f}ns per sample")
+
+    registry.render()
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"export: {(time.perf_counter() - start) * 1000:.2f}ms for {len(text)} bytes")
@@ -0,0 +1,94 @@
+"""Renders typical messages with every text backend and prints frames per second.
+
+Runs without the display hardware: python3 scripts/benchmark_render.py
+
+Every static screen, the personal ID screen and the messages are rendered
+with both backends first, the atlas has to draw them pixel for pixel like
+Pillow. The script exits with 1 otherwise.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from PIL import ImageChops  # noqa: E402
+
+from const import STATIC_SCREENS  # noqa: E402
+from DisplayRenderer import DisplayRenderer  # noqa: E402
+from FontCache import font_cache  # noqa: E402
+
+MESSAGES = {
+    50: "Good morning! Have a great day at work, love you!",
+    80: "Don't forget we have dinner with my parents tonight at seven. Bring the wine :)",
+    140: (
+        "Hey you, I just wanted to say that I'm really proud of you. The last weeks were "
+        "hard but you made it through. See you tonight, big hug!"
+    ),
+}
+
+
+SCREENS = (
+    *STATIC_SCREENS,
+    ("render_center_text", ("Personal ID:\n123456789", 18)),
+    *(("render_message_text", (text, "Alex")) for text in MESSAGES.values()),
+    ("render_message_text", ("Schöne Grüße aus Köln! Ærø, Łódź: AVAWAYAT To Ty", "Zoë", "ffcc00", "202040")),
+)
+
+
+class NullDisplay:
+    """Stand-in for the ST7735 which drops every frame"""
+
+    width = 128
+    height = 160
+    rotation = 90
+
+    def fill(self, color):
+        pass
+
+    def _block(self, x0, y0, x1, y1, data=None):
+        pass
+
+
+def benchmark(backend: str, text: str, frames: int) -> float:
+    renderer = DisplayRenderer(NullDisplay(), backend=backend, persist_frames=False)
+    renderer.render_message_text(text, "Alex")  # warm up caches
+
+    # render and convert every frame, bypassing the frame cache
+    start = time.perf_counter()
+    for _ in range(frames):
+        renderer._to_panel(renderer.render_message_text(text, "Alex"))
+    return frames / (time.perf_counter() - start)
+
+
+def matches_pillow() -> bool:
+    """Renders every screen with both backends and prints the screens which differ"""
+    pillow = DisplayRenderer(NullDisplay(), backend="pillow", persist_frames=False)
+    atlas = DisplayRenderer(NullDisplay(), backend="atlas", persist_frames=False)
+
+    matches = True
+    for render, args in SCREENS:
+        expected = getattr(pillow, render)(*args).convert("RGB")
+        actual = getattr(atlas, render)(*args).convert("RGB")
+        difference = ImageChops.difference(expected, actual)
+        pixels = sum(1 for pixel in difference.getdata() if any(pixel))
+        if pixels:
+            matches = False
+            print(f"{render}{args!r}: {pixels} pixels differ from Pillow")
+    return matches
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    equal = matches_pillow()
+    print(f"{len(SCREENS)} screens, atlas {'matches' if equal else 'DIFFERS FROM'} Pillow")
+
+    print(f"{'chars':>5} {'pillow fps':>11} {'atlas fps':>10}")
+    for chars, text in MESSAGES.items():
+        pillow = benchmark("pillow", text[:chars], frames)
+        atlas = benchmark("atlas", text[:chars], frames)
+        print(f"{chars:>5} {pillow:>11.1f} {atlas:>10.1f}")
+
+    print("font cache:", font_cache.stats())
+    sys.exit(0 if equal else 1)
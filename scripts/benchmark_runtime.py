@@ -0,0 +1,113 @@
+"""Compares the threaded and the asyncio runtime of the Messagebox.
+
+    python3 scripts/benchmark_runtime.py
+
+The box waits in the notify state with mock lid and servo pins. Each
+runtime runs in its own process and reports the CPU time and the thread
+wakeups while nothing happens, and the time from the lid edge until the
+reading state starts.
+"""
+import glob
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from gpiozero.pins.mock import MockFactory
+
+from mock_hardware import MockGPIO, Stub, install_gpio_module
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+install_gpio_module()
+
+import Messagebox as messagebox_module  # noqa: E402
+from AsyncRuntime import AsyncRuntime  # noqa: E402
+from LidSensor import LidSensor  # noqa: E402
+from ServoMotion import MotionEngine  # noqa: E402
+from ServoMotor import ServoMotor  # noqa: E402
+
+PIN = 26
+IDLE_SECONDS = 10
+SAMPLES = 20
+MESSAGE = {"message": {"id": 1, "text": "Hi", "author": {"name": "Alex"}}, "settings": {}}
+
+
+def wakeups() -> int:
+    """Context switches of all threads of the process"""
+    total = 0
+    for path in glob.glob("/proc/self/task/*/status"):
+        with open(path) as status:
+            for line in status:
+                if line.startswith(("voluntary_ctxt_switches:", "nonvoluntary_ctxt_switches:")):
+                    total += int(line.split()[1])
+    return total
+
+
+def build_box(factory: MockFactory):
+    box = messagebox_module.Messagebox.__new__(messagebox_module.Messagebox)
+    box.config = {}
+    box.muted = False
+    box.rotation_count = 1
+    box.rotation_interval = 30
+    box.snapshot_sequence = 0
+    box.last_message = MESSAGE
+    box.lid = LidSensor(PIN, bounce_time=None, pin_factory=factory)
+    box.servo = ServoMotor(17, gpio=MockGPIO())
+    box.motion = MotionEngine(box.servo)
+    for name in ("network", "poller", "store", "outbox", "screen", "display_renderer", "config_handler"):
+        setattr(box, name, Stub())
+    box.current_state = messagebox_module.State.FETCH_MESSAGES
+    return box
+
+
+def run_mode(mode: str) -> None:
+    factory = MockFactory()
+    box = build_box(factory)
+    pin = factory.pin(PIN)
+    pin.drive_low()  # lid closed, after the pull-up of the button was set up
+    reading = threading.Event()
+    reading_at = []
+
+    def read_message():
+        reading_at.append(time.monotonic())
+        reading.set()
+        return True
+
+    box._read_message = read_message
+    box._render_ahead = lambda: None
+
+    run = box.run if mode == "threaded" else AsyncRuntime(box).run
+    threading.Thread(target=run, daemon=True).start()
+
+    # the first motion is over after ~1.5s, then the box waits for the lid
+    time.sleep(2)
+    cpu, switches = time.process_time(), wakeups()
+    time.sleep(IDLE_SECONDS)
+    cpu, switches = time.process_time() - cpu, wakeups() - switches
+
+    latencies = []
+    for _ in range(SAMPLES):
+        reading.clear()
+        edge_at = time.monotonic()
+        pin.drive_high()  # lid opened
+        if not reading.wait(5):
+            sys.exit(f"{mode}: the lid edge did not reach the reading state")
+        latencies.append((reading_at[-1] - edge_at) * 1000)
+        time.sleep(0.05)
+        pin.drive_low()
+        time.sleep(0.2)  # back in the notify state
+
+    print(
+        f"{mode:>8}: idle CPU {cpu / IDLE_SECONDS * 100:5.2f}%, {switches * 60 / IDLE_SECONDS:5.0f} wakeups/min, "
+        f"lid to reading state median {statistics.median(latencies):5.2f}ms, max {max(latencies):5.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_mode(sys.argv[1])
+    else:
+        for mode in ("threaded", "asyncio"):
+            subprocess.run([sys.executable, os.path.realpath(__file__), mode], check=True)
@@ -0,0 +1,89 @@
+"""Checks the conditional polls of the messages endpoint against the mock backend.
+
+    python3 scripts/check_conditional_poll.py
+
+The real MessagePoller and NetworkManager poll without the push stream.
+The second poll has to send the ETag of the first response as
+If-None-Match and get a 304, the poller has to publish the cached
+response again as an unmodified snapshot, and both the counters of the
+box and of the backend have to count one 200 and one 304. A changed
+document has to be downloaded again. Exits with 1 if a check fails.
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from MessagePoller import MessagePoller  # noqa: E402
+from mock_backend import TOKEN, MockBackend  # noqa: E402
+from NetworkManager import NetworkManager  # noqa: E402
+
+TIMEOUT = 5
+
+
+def check(name: str, passed: bool) -> bool:
+    print(f"{'ok' if passed else 'FAILED':>6}  {name}")
+    return passed
+
+
+def poll(poller: MessagePoller, after):
+    """The snapshot of the next poll"""
+    if after is not None:
+        poller.poll_now()
+    return poller.wait_for_snapshot(after.sequence if after is not None else 0, TIMEOUT)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+
+    backend = MockBackend()
+    backend.streaming_enabled = False
+    backend.add_message("Hello")
+    backend.start()
+
+    network = NetworkManager(backend.endpoint)
+    network.configure(backend.endpoint, TOKEN)
+    poller = MessagePoller(network)
+    # only poll_now polls, every poll of the check is triggered explicitly
+    poller.scheduler.first_delay = lambda: 0
+    poller.scheduler.next_delay = lambda error=False, streaming=False: (3600, "check")
+    poller.start()
+
+    first = poll(poller, None)
+    etag = network.etag
+    second = poll(poller, first)
+    if_none_match = backend.last_if_none_match
+    # the stream endpoint answers 404 as well
+    polls = (backend.status_counts.get(200), backend.status_counts.get(304))
+    stats = network.stats.as_dict()
+
+    backend.add_message("Hello again")
+    third = poll(poller, second)
+
+    poller.stop()
+    backend.stop()
+
+    results = [
+        check("first poll downloads the document", first is not None and first.error is None and first.modified),
+        check("first response has an ETag", etag is not None),
+        check("second poll sends it as If-None-Match", if_none_match is not None and if_none_match == etag),
+        check("backend answers 304 Not Modified", polls == (1, 1)),
+        check(
+            "poller publishes the cached response, unmodified",
+            second is not None and second.error is None and not second.modified and second.response is first.response,
+        ),
+        check(
+            "box counts one 200 and one 304",
+            stats["not_modified"] == 1 and stats["not_modified_ratio"] == 0.5,
+        ),
+        check(
+            "changed document is downloaded again",
+            third is not None
+            and third.modified
+            and [message["text"] for message in third.response["messages"]] == ["Hello", "Hello again"]
+            and (backend.status_counts.get(200), backend.status_counts.get(304)) == (2, 1)
+            and network.stats.modified == 2,
+        ),
+    ]
+    sys.exit(0 if all(results) else 1)
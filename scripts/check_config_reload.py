@@ -0,0 +1,96 @@
+"""Checks the config watcher and the persisted server settings.
+
+    python3 scripts/check_config_reload.py
+
+Works on a config.ini in a temporary directory: the box's own writes are
+not reported as changes, an edited file is reloaded, an invalid one is
+ignored and the last server settings survive a new ConfigHandler. A typo
+in an optional setting (log level, bounce time, quiet hours, metrics) is
+rejected when the file is edited, but does not stop the box from starting. Exits with 1 if a check fails.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from ConfigHandler import ConfigHandler  # noqa: E402
+
+INTERVAL = 0.05
+CONFIG = """[SETTINGS]
+endpoint = {endpoint}
+token = {token}
+hardwareid = 123456789
+setup = True
+{extra}"""
+
+
+def handler_in(directory: str) -> ConfigHandler:
+    handler = ConfigHandler()
+    handler.dir_path = directory
+    return handler
+
+
+def edit(handler: ConfigHandler, endpoint: str, token: str, extra: str = "") -> None:
+    # in place, the way an editor or echo >> would change it
+    with open(handler.config_path, "w") as file:
+        file.write(CONFIG.format(endpoint=endpoint, token=token, extra=extra))
+
+
+def check(name: str, passed: bool) -> bool:
+    print(f"{'ok' if passed else 'FAILED':>6}  {name}")
+    return passed
+
+
+if __name__ == "__main__":
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        handler = handler_in(directory)
+        edit(handler, "https://one.example.com", "a")
+        config = handler.load_config()
+
+        changes = []
+        handler.watch(changes.append, interval=INTERVAL)
+
+        config["Token"] = "b"
+        handler.write_config(config)
+        time.sleep(INTERVAL * 4)
+        results.append(check("own write is not reloaded", not changes))
+        results.append(check("no temp file is left", os.listdir(directory) == ["config.ini"]))
+
+        time.sleep(0.01)  # a new mtime even on coarse clocks
+        edit(handler, "https://two.example.com", "c")
+        time.sleep(INTERVAL * 4)
+        results.append(
+            check(
+                "edited file is reloaded",
+                len(changes) == 1 and changes[0]["Endpoint"] == "https://two.example.com" and changes[0]["Token"] == "c",
+            )
+        )
+
+        edit(handler, "not a url", "d")
+        time.sleep(INTERVAL * 4)
+        results.append(check("invalid file is ignored", len(changes) == 1 and handler.config["Token"] == "c"))
+
+        edit(handler, "https://two.example.com", "e", "loglevel = LOUD\nbouncetime = nan\n")
+        time.sleep(INTERVAL * 4)
+        results.append(
+            check("invalid optional setting is ignored on edit", len(changes) == 1 and handler.config["Token"] == "c")
+        )
+        for extra in ("quiethours = 22:00-25:00\n", "metrics = prometheus\n"):
+            edit(handler, "https://two.example.com", "e", extra)
+            time.sleep(INTERVAL * 4)
+            name = extra.split()[0]
+            results.append(
+                check(f"invalid {name} is ignored on edit", len(changes) == 1 and handler.config["Token"] == "c")
+            )
+        handler.stop_watching()
+        config = handler_in(directory).load_config()
+        results.append(check("invalid optional setting does not stop the start", config["Token"] == "e"))
+
+        handler.save_settings({"fetch_interval": 120, "mute": True, "unknown": 1})
+        settings = handler_in(directory).load_settings()
+        results.append(check("settings survive a restart", settings == {"fetch_interval": 120, "mute": True}))
+
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,68 @@
+"""Checks the push stream against the mock backend with each line ending.
+
+    python3 scripts/check_message_stream.py
+
+The event stream format allows CRLF, LF and CR to end a line. For each
+of them the first pushed event must arrive as a "messages" event with the
+full document, and keep-alives must not trigger a refetch. Exits with 1
+if a check fails.
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+import mock_backend  # noqa: E402
+from mock_backend import TOKEN, MockBackend  # noqa: E402
+from NetworkManager import NetworkManager  # noqa: E402
+
+TIMEOUT = 5
+mock_backend.HEARTBEAT_INTERVAL = 0.05  # a few keep-alives after the first event
+
+
+def check(name: str, passed: bool) -> bool:
+    print(f"{'ok' if passed else 'FAILED':>6}  {name}")
+    return passed
+
+
+def first_responses(line_ending: str) -> list:
+    """What the box received from a stream with the given line ending"""
+    backend = MockBackend()
+    backend.line_ending = line_ending
+    backend.add_message("Hi\r\nthere")
+    backend.start()
+
+    network = NetworkManager(backend.endpoint)
+    network.configure(backend.endpoint, TOKEN)
+    responses = []
+    received = threading.Event()
+    stop_event = threading.Event()
+
+    def on_response(response):
+        responses.append(response)
+        received.set()
+
+    listener = threading.Thread(target=network.listen_messages, args=(on_response, stop_event), daemon=True)
+    listener.start()
+    received.wait(TIMEOUT)
+    stop_event.wait(mock_backend.HEARTBEAT_INTERVAL * 5)  # keep-alives come in
+    stop_event.set()
+    backend.stop()
+    listener.join(TIMEOUT)
+    return responses
+
+
+if __name__ == "__main__":
+    results = []
+    for name, line_ending in (("LF", "\n"), ("CRLF", "\r\n"), ("CR", "\r")):
+        responses = first_responses(line_ending)
+        results.append(
+            check(
+                f"{name}: one messages event with the document",
+                len(responses) == 1
+                and responses[0] is not None
+                and responses[0]["message"].get("text") == "Hi\r\nthere",
+            )
+        )
+    sys.exit(0 if all(results) else 1)
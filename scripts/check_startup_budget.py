@@ -0,0 +1,54 @@
+"""Fails if the time from process start to the first frame goes over a budget.
+
+    python3 scripts/check_startup_budget.py [budget seconds]
+
+Runs main.py --startup-profile with mock hardware (display, servo GPIO,
+gpiozero mock pins) in fresh processes: one run to build the caches, as
+on a box which started before, then RUNS measured ones. Exits with 1 if
+the median is over the budget (const.STARTUP_BUDGET by default). On the
+box itself use: python3 main.py --startup-profile --startup-budget
+"""
+import os
+import re
+import runpy
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from mock_hardware import install_mock_hardware
+
+SRC = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src")
+RUNS = 5
+
+
+def run_once() -> float:
+    """Seconds from process start to the first frame of one run"""
+    with tempfile.TemporaryDirectory() as directory:
+        # logs/ is created in the working directory
+        result = subprocess.run(
+            [sys.executable, os.path.realpath(__file__), "--child"], cwd=directory, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        sys.exit("main.py --startup-profile failed:\n" + result.stdout + result.stderr)
+    print(result.stdout.rstrip())
+    return float(re.search(r"^First frame\s+([\d.]+)s", result.stdout, re.MULTILINE).group(1))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        install_mock_hardware()
+        sys.path.insert(0, SRC)
+        sys.argv = ["main.py", "--startup-profile"]
+        runpy.run_path(os.path.join(SRC, "main.py"), run_name="__main__")
+
+    sys.path.insert(0, SRC)
+    from const import STARTUP_BUDGET
+
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else STARTUP_BUDGET
+    run_once()  # builds the screen bundle and the font metrics if they are missing
+    first_frames = [run_once() for _ in range(RUNS)]
+    median = statistics.median(first_frames)
+    print(f"first frame median {median:.3f}s after process start, budget {budget:.2f}s")
+    if median > budget:
+        sys.exit(1)
@@ -0,0 +1,282 @@
+"""Small local stand-in for the messagebox-backend, for trying the box without a server.
+
+    python3 scripts/mock_backend.py [port]
+
+Set "endpoint = http://localhost:<port>" in config.ini. New messages can be
+queued with: curl -X POST -d '{"text": "Hi", "author": "Alex"}' localhost:<port>/mock/messages
+
+It can also be used from Python: start MockBackend(), call add_message() and
+inspect the counters to see how the box talks to the backend.
+"""
+import gzip
+import hashlib
+import json
+import sys
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN = "mock-token"
+HEARTBEAT_INTERVAL = 15
+# ways the messages endpoint can misbehave: a captive portal, a broken proxy, a lost connection
+FAILURES = ("unauthorized", "html", "invalid_json", "not_a_document", "bad_gzip", "truncated")
+
+
+class MockBackend:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.messages = []
+        self.settings = {"mute": False, "rotation_count": 1, "fetch_interval": 60, "rotation_interval": 30}
+        self.next_id = 1
+        self.version = 1
+        self.last_modified = formatdate(usegmt=True)
+
+        self.status_counts = {}
+        self.bytes_sent = 0
+        self.requests = []
+
+        # set to False to simulate a backend without the push stream
+        self.streaming_enabled = True
+        # set to False to simulate a backend which only marks one message per request
+        self.batch_read_enabled = True
+        # line ending of the push stream, servers may use "\r\n" or "\r" as well
+        self.line_ending = "\n"
+        # GET /api/messages answers with these in turn, see FAILURES, None for a normal response
+        self.messages_failures = []
+        self.messages_requests = 0
+        # If-None-Match of the last GET /api/messages, None if it had none
+        self.last_if_none_match = None
+        self.stopping = False
+
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockBackend":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self.lock:
+            self.stopping = True
+            self.changed.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_message(self, text: str, author: str = "Mock", text_color: str = "ffffff", bg_color: str = "000000") -> dict:
+        with self.lock:
+            message = {
+                "id": self.next_id,
+                "text": text,
+                "author": {"name": author},
+                "text_color": text_color,
+                "background_color": bg_color,
+            }
+            self.next_id += 1
+            self.messages.append(message)
+            self._changed()
+        return message
+
+    def update_settings(self, **settings) -> None:
+        with self.lock:
+            self.settings.update(settings)
+            self._changed()
+
+    def messages_document(self) -> dict:
+        with self.lock:
+            message = self.messages[0] if self.messages else {}
+            return {"message": message, "messages": list(self.messages), "settings": dict(self.settings)}
+
+    def etag(self) -> str:
+        return '"%s"' % hashlib.sha1(str(self.version).encode()).hexdigest()[:16]
+
+    def _changed(self) -> None:
+        self.version += 1
+        self.last_modified = formatdate(usegmt=True)
+        self.changed.notify_all()
+
+    def _handler(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are separate writes, without this each response waits for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: dict = None, headers: dict = None) -> None:
+                data = b""
+                headers = dict(headers or {})
+                if body is not None:
+                    data = json.dumps(body).encode("utf8")
+                    headers["Content-Type"] = "application/json"
+                    if "gzip" in self.headers.get("Accept-Encoding", ""):
+                        data = gzip.compress(data)
+                        headers["Content-Encoding"] = "gzip"
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+                with backend.lock:
+                    backend.status_counts[status] = backend.status_counts.get(status, 0) + 1
+                    backend.bytes_sent += len(data)
+
+            def _authorized(self) -> bool:
+                if self.headers.get("Authorization") == "Bearer " + TOKEN:
+                    return True
+                self._send(401, {"error": "Unauthenticated"})
+                return False
+
+            def _read_body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                backend.requests.append(("GET", self.path))
+                if self.path.startswith("/api/register"):
+                    self._send(200, {"token": TOKEN})
+                elif self.path == "/api/messages":
+                    with backend.lock:
+                        failures = backend.messages_failures
+                        failure = failures[backend.messages_requests % len(failures)] if failures else None
+                        backend.messages_requests += 1
+                        backend.last_if_none_match = self.headers.get("If-None-Match")
+                    if failure is not None:
+                        self._fail(failure)
+                        return
+                    if not self._authorized():
+                        return
+                    etag = backend.etag()
+                    if self.headers.get("If-None-Match") == etag or (
+                        "If-None-Match" not in self.headers
+                        and self.headers.get("If-Modified-Since") == backend.last_modified
+                    ):
+                        self._send(304, headers={"ETag": etag})
+                        return
+                    self._send(
+                        200,
+                        backend.messages_document(),
+                        {"ETag": etag, "Last-Modified": backend.last_modified},
+                    )
+                elif self.path == "/api/messages/stream" and backend.streaming_enabled:
+                    if self._authorized():
+                        self._stream()
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def _fail(self, failure: str) -> None:
+                if failure == "unauthorized":
+                    self._send(401, {"error": "Unauthenticated"})
+                    return
+                if failure == "not_a_document":
+                    self._send(200, ["message", "settings"])
+                    return
+
+                data = {
+                    "html": b"<html><body>Please log in to the hotspot</body></html>",
+                    "invalid_json": b'{"message": {"id": 1',
+                    "bad_gzip": b"not gzip at all",
+                    "truncated": b'{"message": {}, "settings": {}}',
+                }[failure]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html" if failure == "html" else "application/json")
+                if failure == "bad_gzip":
+                    self.send_header("Content-Encoding", "gzip")
+                # the connection is closed after half of the announced body
+                self.send_header("Content-Length", str(len(data) * (2 if failure == "truncated" else 1)))
+                self.end_headers()
+                self.wfile.write(data)
+                if failure == "truncated":
+                    self.close_connection = True
+                with backend.lock:
+                    backend.status_counts[200] = backend.status_counts.get(200, 0) + 1
+                    backend.bytes_sent += len(data)
+
+            def _stream(self) -> None:
+                """Server-Sent Events: the full messages document on every change"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                version = None
+                try:
+                    while True:
+                        with backend.lock:
+                            backend.changed.wait_for(
+                                lambda: backend.version != version or backend.stopping, HEARTBEAT_INTERVAL
+                            )
+                            if backend.stopping:
+                                return
+                            changed = backend.version != version
+                            version = backend.version
+
+                        end = backend.line_ending
+                        if changed:
+                            data = json.dumps(backend.messages_document())
+                            text = f"event: messages{end}data: {data}{end}{end}"
+                        else:
+                            text = f": keep-alive{end}{end}"
+                        # two writes, a line ending may arrive split across reads
+                        split = text.index(end) + 1
+                        for part in (text[:split], text[split:]):
+                            self.wfile.write(part.encode("utf8"))
+                            self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+
+            def do_PATCH(self):
+                backend.requests.append(("PATCH", self.path))
+                body = self._read_body()  # always consumed, the connection is kept alive
+                if self.path == "/api/messages" and backend.batch_read_enabled:
+                    if not self._authorized():
+                        return
+                    message_ids = set(body.get("ids", []))
+                elif self.path.startswith("/api/messages/"):
+                    if not self._authorized():
+                        return
+                    message_ids = {int(self.path.rsplit("/", 1)[1])}
+                else:
+                    self._send(404, {"error": "Not found"})
+                    return
+                with backend.lock:
+                    backend.messages = [m for m in backend.messages if m["id"] not in message_ids]
+                    backend._changed()
+                self._send(200, {"read": sorted(message_ids)})
+
+            def do_POST(self):
+                backend.requests.append(("POST", self.path))
+                if self.path == "/mock/messages":
+                    body = self._read_body()
+                    self._send(201, backend.add_message(body.get("text", ""), body.get("author", "Mock")))
+                elif self.path == "/mock/settings":
+                    backend.update_settings(**self._read_body())
+                    self._send(200, backend.settings)
+                else:
+                    self._send(404, {"error": "Not found"})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    backend = MockBackend("0.0.0.0", port)
+    print(f"Mock backend listening on {backend.endpoint}")
+    try:
+        backend.server.serve_forever()
+    except KeyboardInterrupt:
+        backend.server.server_close()
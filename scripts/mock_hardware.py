@@ -0,0 +1,99 @@
+"""Stand-ins for the box hardware, shared by the soak, benchmark and check scripts.
+
+Call install_gpio_module() before importing ServoMotor or Messagebox on a
+machine without RPi.GPIO, install_mock_hardware() to run main.py itself.
+gpiozero brings its own mock pins (MockFactory).
+"""
+import os
+import sys
+import threading
+import time
+import types
+
+
+class MockPWM:
+    def __init__(self):
+        self.duty_cycle = 0
+        self.changes = []  # (time, duty cycle)
+        self.lock = threading.Lock()
+
+    def start(self, duty_cycle):
+        self.ChangeDutyCycle(duty_cycle)
+
+    def ChangeDutyCycle(self, duty_cycle):
+        with self.lock:
+            self.duty_cycle = duty_cycle
+            self.changes.append((time.monotonic(), duty_cycle))
+
+    def stop(self):
+        pass
+
+
+class MockGPIO:
+    BCM = "BCM"
+    OUT = "OUT"
+
+    def __init__(self):
+        self.pwm = MockPWM()
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, direction):
+        pass
+
+    def PWM(self, pin, frequency):
+        return self.pwm
+
+    def cleanup(self):
+        pass
+
+
+class MockDisplay:
+    width = 128
+    height = 160
+
+    def __init__(self, rotation=0, **kwargs):
+        self.rotation = rotation
+
+    def fill(self, color):
+        pass
+
+    def _block(self, x0, y0, x1, y1, data=None):
+        pass
+
+
+class Stub:
+    """Accepts every call and returns None"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def install_gpio_module() -> None:
+    """Provides an empty RPi.GPIO if it is not installed, ServoMotor imports it.
+
+    The scripts pass a MockGPIO to the servo explicitly."""
+    try:
+        import RPi.GPIO  # noqa: F401
+    except (ImportError, RuntimeError):
+        sys.modules["RPi"] = types.ModuleType("RPi")
+        sys.modules["RPi.GPIO"] = sys.modules["RPi"].GPIO = types.ModuleType("RPi.GPIO")
+
+
+def install_mock_hardware() -> None:
+    """Replaces the display, the servo GPIO and the gpiozero pins which main.py uses"""
+    st7735 = types.ModuleType("adafruit_rgb_display.st7735")
+    st7735.ST7735R = MockDisplay
+    sys.modules["adafruit_rgb_display"] = types.ModuleType("adafruit_rgb_display")
+    sys.modules["adafruit_rgb_display"].st7735 = sys.modules["adafruit_rgb_display.st7735"] = st7735
+
+    board = sys.modules["board"] = types.ModuleType("board")
+    board.SPI = lambda: None
+    board.CE0 = board.D24 = board.D25 = None
+    digitalio = sys.modules["digitalio"] = types.ModuleType("digitalio")
+    digitalio.DigitalInOut = lambda pin: None
+
+    install_gpio_module()
+    sys.modules["RPi"].GPIO = sys.modules["RPi.GPIO"] = MockGPIO()
+    os.environ["GPIOZERO_PIN_FACTORY"] = "mock"
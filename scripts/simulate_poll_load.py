@@ -0,0 +1,154 @@
+"""Simulates the request load a fleet of boxes puts on the backend.
+
+    python3 scripts/simulate_poll_load.py [devices]
+
+All boxes are powered on at the same moment and the backend is down for
+a while. The fixed schedule (fetch interval, 5s after errors) is compared
+with the PollScheduler. Prints requests per second at the peak and the
+99th percentile, and the requests which hit the backend while it was down.
+
+Then checks the scheduler itself: the error backoff stays under its cap,
+the jitter spreads the boxes and quiet hours stretch the interval. Exits
+with 1 if a check fails.
+"""
+import heapq
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from const import ERROR_BACKOFF_MAX, POLL_JITTER, QUIET_HOURS_FACTOR, STARTUP_JITTER  # noqa: E402
+from PollScheduler import PollScheduler  # noqa: E402
+
+FETCH_INTERVAL = 60
+DURATION = 3600
+OUTAGE = (600, 900)  # backend down from/to (seconds after power-on)
+START = 12 * 3600.0  # noon, outside of any quiet hours
+
+
+class FixedSchedule:
+    """Schedule of the box before the PollScheduler"""
+
+    def first_delay(self) -> float:
+        return 0
+
+    def next_delay(self, error: bool = False, streaming: bool = False) -> tuple:
+        return (5 if error else FETCH_INTERVAL), ""
+
+
+def simulate(make_schedule, devices: int) -> dict:
+    clock = [START]
+    schedules = [make_schedule(device, clock) for device in range(devices)]
+
+    # every box polls right after booting
+    queue = [(START + schedules[device].first_delay(), device) for device in range(devices)]
+    heapq.heapify(queue)
+
+    per_second = Counter()
+    during_outage = 0
+    while queue:
+        now, device = heapq.heappop(queue)
+        elapsed = now - START
+        if elapsed >= DURATION:
+            break
+        clock[0] = now
+
+        per_second[int(elapsed)] += 1
+        error = OUTAGE[0] <= elapsed < OUTAGE[1]
+        during_outage += error
+
+        delay, _ = schedules[device].next_delay(error)
+        heapq.heappush(queue, (now + delay, device))
+
+    load = sorted(per_second[second] for second in range(DURATION))
+    return {
+        "requests": sum(load),
+        "peak_per_second": load[-1],
+        "p99_per_second": load[int(len(load) * 0.99)],
+        "mean_per_second": sum(load) / len(load),
+        "during_outage": during_outage,
+        "peak_after_outage": max(per_second[second] for second in range(OUTAGE[1], OUTAGE[1] + 60)),
+    }
+
+
+def adaptive(device: int, clock) -> PollScheduler:
+    return PollScheduler(FETCH_INTERVAL, seed="%09d" % device, clock=lambda: clock[0])
+
+
+def check(name: str, passed: bool) -> bool:
+    print(f"{'ok' if passed else 'FAILED':>6}  {name}")
+    return passed
+
+
+def check_backoff() -> bool:
+    clock = [START]
+    scheduler = adaptive(0, clock)
+    delays = [scheduler.next_delay(error=True)[0] for _ in range(50)]
+    return check(
+        f"error backoff stays under {ERROR_BACKOFF_MAX}s and reaches its upper half",
+        max(delays) <= ERROR_BACKOFF_MAX and min(delays[-10:]) >= ERROR_BACKOFF_MAX * 0.5,
+    )
+
+
+def check_jitter(devices: int = 1000) -> bool:
+    clock = [START]
+    schedulers = [adaptive(device, clock) for device in range(devices)]
+    first = [scheduler.first_delay() for scheduler in schedulers]
+    delays = [scheduler.next_delay()[0] for scheduler in schedulers]
+    low, high = FETCH_INTERVAL * (1 - POLL_JITTER), FETCH_INTERVAL * (1 + POLL_JITTER)
+    return check(
+        "jitter spreads the first poll and the fetch interval",
+        min(first) >= 0
+        and max(first) <= STARTUP_JITTER
+        and max(first) - min(first) >= STARTUP_JITTER * 0.9
+        and all(low <= delay <= high for delay in delays)
+        and max(delays) - min(delays) >= (high - low) * 0.9,
+    )
+
+
+def check_quiet_hours() -> bool:
+    clock = [START]
+    hour = time.localtime(START).tm_hour  # quiet hours are in local time
+    # the hour the simulation runs in, and one which is over
+    quiet = adaptive(0, clock)
+    quiet.set_quiet_hours("%02d:00-%02d:00" % (hour, (hour + 1) % 24))
+    awake = adaptive(0, clock)
+    awake.set_quiet_hours("%02d:00-%02d:00" % ((hour + 22) % 24, (hour + 23) % 24))
+    stretched = FETCH_INTERVAL * QUIET_HOURS_FACTOR
+    delay, reason = quiet.next_delay()
+    awake_delay, awake_reason = awake.next_delay()
+    return check(
+        "quiet hours stretch the interval only while they last",
+        reason == "quiet hours"
+        and stretched * (1 - POLL_JITTER) <= delay <= stretched * (1 + POLL_JITTER)
+        and awake_reason == "fetch interval"
+        and awake_delay <= FETCH_INTERVAL * (1 + POLL_JITTER),
+    )
+
+
+if __name__ == "__main__":
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"{devices} boxes, fetch interval {FETCH_INTERVAL}s, backend down {OUTAGE[0]}-{OUTAGE[1]}s")
+    results = {}
+    for name, make_schedule in (("fixed", lambda device, clock: FixedSchedule()), ("adaptive", adaptive)):
+        result = results[name] = simulate(make_schedule, devices)
+        print(
+            f"{name:>8}: {result['requests']:6d} requests, "
+            f"peak {result['peak_per_second']:4d}/s, p99 {result['p99_per_second']:4d}/s, "
+            f"mean {result['mean_per_second']:5.1f}/s, {result['during_outage']:5d} during the outage, "
+            f"peak {result['peak_after_outage']:4d}/s after it"
+        )
+
+    passed = [
+        check_backoff(),
+        check_jitter(),
+        check_quiet_hours(),
+        check(
+            "adaptive schedule halves the peak and the requests during the outage",
+            results["adaptive"]["peak_per_second"] * 2 <= results["fixed"]["peak_per_second"]
+            and results["adaptive"]["during_outage"] * 2 <= results["fixed"]["during_outage"],
+        ),
+    ]
+    sys.exit(0 if all(passed) else 1)
@@ -0,0 +1,69 @@
+"""Checks the servo motion engine against a mock GPIO.
+
+    python3 scripts/soak_servo_motion.py [cycles]
+
+Runs notify cycles (play, lid opens, cancel) with random timing and
+checks that the motor stops within one step of every cancellation, that
+the PWM is idle afterwards and that no threads are left over. Exits with
+1 if a check fails.
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from mock_hardware import MockGPIO, install_gpio_module  # noqa: E402
+
+install_gpio_module()
+
+from ServoMotion import MotionEngine, build_profile  # noqa: E402
+from ServoMotor import ServoMotor  # noqa: E402
+
+SPEED = 0.002  # shortened holds, the engine does not care about the scale
+
+
+def soak(cycles: int) -> bool:
+    gpio = MockGPIO()
+    baseline = threading.active_count()
+    engine = MotionEngine(ServoMotor(17, gpio=gpio))
+    max_threads = 0
+
+    ok = True
+    late_moves = 0
+    worst_stop = 0.0
+    for cycle in range(cycles):
+        rotation_count = random.randint(1, 3)
+        engine.play(build_profile(rotation_count, SPEED, SPEED), repeat_every=random.uniform(0, 3 * SPEED))
+        time.sleep(random.uniform(0, 10 * SPEED))  # the lid opens at a random point of the motion
+
+        cancelled_at = time.monotonic()
+        if not engine.cancel():
+            print(f"cycle {cycle}: cancel timed out")
+            ok = False
+        worst_stop = max(worst_stop, time.monotonic() - cancelled_at)
+        max_threads = max(max_threads, threading.active_count())
+
+        with gpio.pwm.lock:
+            after = [duty for at, duty in gpio.pwm.changes if at >= cancelled_at]
+            idle = gpio.pwm.duty_cycle == 0
+            gpio.pwm.changes.clear()
+        # at most the step which was already being set, then the idle
+        moves = [duty for duty in after if duty != 0]
+        if len(moves) > 1 or not idle:
+            late_moves += 1
+
+    engine.stop()
+    leftover = threading.active_count() - baseline
+
+    print(f"{cycles} notify cycles, {engine.steps} steps, {engine.cancelled} cancelled or preempted")
+    print(f"cancel to idle PWM: max {worst_stop * 1000:.2f}ms, {late_moves} cycles moved after cancel")
+    print(f"threads: at most {max_threads} while running, {leftover} left over after stop")
+    return ok and late_moves == 0 and max_threads == baseline + 1 and leftover == 0
+
+
+if __name__ == "__main__":
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sys.exit(0 if soak(cycles) else 1)
@@ -0,0 +1,148 @@
+"""Drives the Messagebox state machine through thousands of simulated outages.
+
+    python3 scripts/soak_state_machine.py [outages]
+
+The real MessagePoller and NetworkManager poll the mock backend, which
+answers in turn with every failure of mock_backend.FAILURES (rejected
+token, captive portal page, invalid or truncated bodies, ...) and a
+normal response in between. The poll thread has to survive all of them,
+the failures have to reach the state machine as errors it recovers from
+and no state may wait for a snapshot in vain. Stack depth and RSS are
+sampled along the way and have to stay flat, once the connections and
+caches are warm. The script exits with 1 otherwise. Runs without the box
+hardware, time.sleep and the poll delays are skipped.
+"""
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from mock_hardware import Stub, install_gpio_module  # noqa: E402
+
+install_gpio_module()
+
+import Messagebox as messagebox_module  # noqa: E402
+from MessagePoller import MessagePoller  # noqa: E402
+from mock_backend import FAILURES, TOKEN, MockBackend  # noqa: E402
+from NetworkManager import NetworkManager  # noqa: E402
+
+SAMPLE_EVERY = 200  # transitions
+STEP_TIMEOUT = 5  # seconds a state may take before the box counts as hung
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def stack_depth() -> int:
+    frame, depth = sys._getframe(), 0
+    while frame is not None:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+
+def build_box(backend: MockBackend):
+    box = messagebox_module.Messagebox.__new__(messagebox_module.Messagebox)
+    box.config = {"HardwareId": "123456789"}
+    box._config_lock = threading.Lock()
+    box.last_message = {}
+    box.muted = False
+    box.snapshot_sequence = 0
+    box.network = NetworkManager(backend.endpoint)
+    box.network.configure(backend.endpoint, TOKEN)
+    box.poller = MessagePoller(box.network)
+    # no waiting between polls, the backoff itself is checked by simulate_poll_load.py
+    box.poller.scheduler.first_delay = lambda: 0
+    box.poller.scheduler.next_delay = lambda error=False, streaming=False: (0, "soak")
+    box.store = Stub()
+    box.outbox = Stub()
+    box.screen = Stub()
+    box.display_renderer = Stub()
+    box.config_handler = Stub()
+    return box
+
+
+def soak(outages: int) -> bool:
+    messagebox_module.time = types.SimpleNamespace(sleep=lambda seconds: None)
+    messagebox_module.SNAPSHOT_WAIT_TIMEOUT = STEP_TIMEOUT
+
+    backend = MockBackend()
+    backend.streaming_enabled = False
+    # every failure followed by a normal response
+    backend.messages_failures = [mode for failure in FAILURES for mode in (failure, None)]
+    backend.start()
+    box = build_box(backend)
+
+    errors = {}
+    recover = box.recover
+
+    def count_recovery(state, ex):
+        errors[type(ex).__name__] = errors.get(type(ex).__name__, 0) + 1
+        return recover(state, ex)
+
+    box.recover = count_recovery
+
+    # sampled inside fetch_messages_state, min and max only so the samples do not grow RSS
+    depths = [sys.maxsize, 0]
+
+    def sample_depth():
+        depth = stack_depth()
+        depths[:] = [min(depths[0], depth), max(depths[1], depth)]
+        return {}
+
+    box.network.connection_stats = sample_depth
+
+    state = messagebox_module.State.FETCH_MESSAGES
+    samples = []
+    steps = 0
+    timeouts = 0
+    box.poller.start()
+    # register_state prints the hardware id
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        while backend.messages_requests < outages * 2:
+            started = time.monotonic()
+            state = box.step(state)
+            if time.monotonic() - started >= STEP_TIMEOUT:
+                timeouts += 1  # no snapshot within STEP_TIMEOUT
+                if timeouts > 3:
+                    break
+            steps += 1
+            if steps % SAMPLE_EVERY == 0:
+                # the request log of the mock would count as growth of the box
+                with backend.lock:
+                    backend.requests.clear()
+                samples.append(rss_kb())
+
+    poller_alive = box.poller.is_running()
+    box.poller.stop()
+    backend.stop()
+
+    warm = samples[len(samples) // 3]
+    growth = samples[-1] - warm
+    print(f"{outages} outages, {steps} transitions, {backend.messages_requests} polls")
+    print("recovered: " + ", ".join(f"{name} {count}" for name, count in sorted(errors.items())))
+    print(f"poll thread alive: {poller_alive}, {timeouts} waits without a snapshot")
+    print(f"stack depth: min {depths[0]}, max {depths[1]}")
+    print(f"RSS: {samples[0]} kB at start, {warm} kB warm, {samples[-1]} kB at the end ({growth:+d} kB)")
+    return (
+        poller_alive
+        and timeouts == 0
+        and set(errors) == {"UnauthenticatedError", "InvalidResponseError"}
+        and depths[0] == depths[1]
+        and growth < 512
+    )
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+    outages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    sys.exit(0 if soak(outages) else 1)
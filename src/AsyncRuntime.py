@@ -0,0 +1,183 @@
+import asyncio
+import logging
+
+from const import LID_RECHECK_INTERVAL, SNAPSHOT_WAIT_TIMEOUT
+from LidSensor import CLOSED, OPENED
+from Messagebox import State
+from Metrics import metrics
+from ServoMotion import build_profile
+
+
+class AsyncRuntime:
+    """Runs the Messagebox states as coroutines on one asyncio event loop.
+
+    Snapshots of the poller and edges of the lid sensor arrive as events on
+    the loop, servo steps and retry delays are scheduled timers instead of
+    sleeping threads. Blocking work (requests, config and SQLite writes)
+    runs in the default executor, rendering and SPI stay on the display
+    worker. Messagebox.run() remains the threaded fallback."""
+
+    def __init__(self, box):
+        self.box = box
+
+        self.loop = None
+        self._snapshot = None
+        self._snapshot_changed = None
+        self._lid_events = None
+        self._motion = None
+
+    def run(self) -> None:
+        asyncio.run(self.main())
+
+    async def main(self) -> None:
+        box = self.box
+        self.loop = asyncio.get_running_loop()
+        self._snapshot_changed = asyncio.Event()
+        self._lid_events = asyncio.Queue()
+
+        box.poller.subscribe(self._on_snapshot)
+        box.lid.add_listener(self._on_edge)
+
+        logging.info("Messagebox started (asyncio)")
+        while True:
+            box.current_state = await self.step(box.current_state)
+            logging.info("Current State: %s", box.current_state)
+
+    async def step(self, state: State) -> State:
+        """Same as Messagebox.step, with the handlers and delays of this runtime"""
+        handler = getattr(self, self.box.HANDLERS[state])
+        try:
+            with metrics.timer("messagebox_state_seconds", state=state.name):
+                return await handler()
+        except Exception as ex:
+            recovery = self.box.recover(state, ex)
+            if recovery is None:
+                raise
+            next_state, delay = recovery
+            await asyncio.sleep(delay)
+            return next_state
+
+    async def load_config(self) -> State:
+        return await self._blocking(self.box.load_config)
+
+    async def register_state(self) -> State:
+        box = self.box
+        logging.info("Register box...")
+
+        box._show_hardware_id()
+        token = await self._blocking(box.network.register_device, box.config["HardwareId"])
+
+        if token:
+            await self._blocking(box._registered, token)
+            await self._blocking(box.screen.wait_idle)
+            await asyncio.sleep(3)
+
+            return State.FETCH_MESSAGES
+
+        await asyncio.sleep(10)
+
+        return State.REGISTER_DEVICE
+
+    async def fetch_messages_state(self) -> State:
+        box = self.box
+        logging.info("Fetching messages...")
+
+        if box._has_message_to_notify():
+            return State.NOTIFY
+
+        while self._snapshot is None or self._snapshot.sequence <= box.snapshot_sequence:
+            self._snapshot_changed.clear()
+            try:
+                await asyncio.wait_for(self._snapshot_changed.wait(), SNAPSHOT_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                return box._on_snapshot_timeout()
+
+        return box._apply_snapshot(self._snapshot)
+
+    async def notify_state(self) -> State:
+        box = self.box
+        logging.info("Notify user...")
+
+        if not box.muted:
+            logging.info("Rotating servo")
+            profile = build_profile(box.rotation_count)
+            self._motion = asyncio.ensure_future(self._rotate(profile, box.rotation_interval))
+
+        # the next message is rendered while the user opens the box
+        box._render_ahead()
+
+        await self._lid(OPENED)
+        await self._stop_motion()
+        logging.info("Box opend")
+
+        return State.READING
+
+    async def reading_state(self) -> State:
+        logging.info("Sending reading request")
+
+        if await self._blocking(self.box._read_message):
+            logging.info("Waiting for box is closed")
+            await self._lid(CLOSED)
+            logging.info("Box closed!")
+
+        return State.FETCH_MESSAGES
+
+    async def _rotate(self, profile: tuple, repeat_every: float) -> None:
+        servo = self.box.servo
+        try:
+            while True:
+                with metrics.timer("messagebox_servo_motion_seconds"):
+                    for duty_cycle, hold in profile:
+                        metrics.inc("messagebox_servo_steps_total")
+                        servo.set_duty_cycle(duty_cycle)
+                        await asyncio.sleep(hold)
+                await asyncio.sleep(repeat_every)
+        finally:
+            servo.set_duty_cycle(0)
+
+    async def _stop_motion(self) -> None:
+        if self._motion is not None:
+            self._motion.cancel()
+            try:
+                await self._motion
+            except asyncio.CancelledError:
+                pass
+            self._motion = None
+
+    async def _lid(self, event: str) -> None:
+        """Waits until the lid is opened or closed"""
+        # edges from before the wait are outdated, the current state counts
+        while not self._lid_events.empty():
+            self._lid_events.get_nowait()
+        if self.box.lid.is_open == (event == OPENED):
+            return
+
+        while True:
+            try:
+                received, edge_at = await asyncio.wait_for(self._lid_events.get(), LID_RECHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                # an edge may have been lost, the contact tells the state
+                if self.box.lid.is_open == (event == OPENED):
+                    logging.debug("Lid %s without an edge", event)
+                    return
+                continue
+            if received == event:
+                logging.debug("Lid %s, handled after %.1fms", event, (self.loop.time() - edge_at) * 1000)
+                return
+
+    async def _blocking(self, function, *args):
+        return await self.loop.run_in_executor(None, function, *args)
+
+    def _on_snapshot(self, snapshot) -> None:
+        # poller thread
+        self.loop.call_soon_threadsafe(self._snapshot_arrived, snapshot)
+
+    def _snapshot_arrived(self, snapshot) -> None:
+        self._snapshot = snapshot
+        self._snapshot_changed.set()
+        if self.box.muted and self._motion is not None:
+            self._motion.cancel()
+
+    def _on_edge(self, event: str, edge_at: float) -> None:
+        # gpiozero thread
+        self.loop.call_soon_threadsafe(self._lid_events.put_nowait, (event, edge_at))
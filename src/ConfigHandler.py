@@ -1,6 +1,18 @@
 import configparser
+import io
+import json
+import logging
+import math
 import os
 import re
+import threading
+
+from const import CONFIG_WATCH_INTERVAL, DATA_DIRECTORY, SETTINGS_NAME
+from Metrics import exporter_mode
+from PollScheduler import parse_quiet_hours
+
+# server settings which are kept for the next start
+SETTINGS_KEYS = ("fetch_interval", "rotation_interval", "rotation_count", "mute")
 
 
 class ConfigHandler:
@@ -18,10 +30,16 @@ class ConfigHandler:
 
         self.dir_path = os.path.dirname(os.path.realpath(__file__))
 
-        self.config = {"Endpoint": "", "Token": "", "HardwareId": "", "SetUp": False}
+        self.config = {"Endpoint": "", "Token": "", "HardwareId": "", "SetUp": False, "QuietHours": "", "BounceTime": "", "Metrics": "", "LogLevel": ""}
 
         self.valid_url_regex = self.url_regex()
 
+        # (mtime, size) of the file as it was last read or written
+        self._file_state = None
+        self._lock = threading.Lock()
+        self._stop_watching = threading.Event()
+        self._watch_thread = None
+
     def url_regex(self):
         return re.compile(
             r"^(?:http|ftp)s?://"  # http:// or https://
@@ -37,44 +55,171 @@ class ConfigHandler:
     def is_host_valid(self, url: str) -> bool:
         return re.match(self.valid_url_regex, url) is not None
 
+    @property
+    def config_path(self) -> str:
+        return self.dir_path + "/" + self.CONFIG_NAME
+
+    @property
+    def settings_path(self) -> str:
+        return os.path.join(self.dir_path, DATA_DIRECTORY, SETTINGS_NAME)
+
     def config_exists(self) -> bool:
         """Checks if the config file exists or not"""
-        return os.path.exists(self.dir_path + "/" + self.CONFIG_NAME)
+        return os.path.exists(self.config_path)
 
     def create_config(self) -> None:
         """Creates a new config file"""
 
         # Remove old config file to avoid conflicts
         if self.config_exists():
-            os.remove(self.dir_path + "/" + self.CONFIG_NAME)
+            os.remove(self.config_path)
 
         self.write_config(self.config)
 
-    def load_config(self) -> dict:
-        """Loads the configuration file."""
+    def load_config(self, strict: bool = False) -> dict:
+        """Loads and validates the configuration file, see validate for strict."""
         if not self.config_exists():
             raise FileNotFoundError
 
-        self.parser.read(self.dir_path + "/" + self.CONFIG_NAME)
-
-        self.config["Endpoint"] = self.parser[self.CONFIG_CATEGORY]["Endpoint"]
-
-        if not self.is_host_valid(self.config["Endpoint"]):
-            raise Exception("Invalid host")
-
-        self.config["SetUp"] = self.parser.getboolean(self.CONFIG_CATEGORY, "SetUp")
-        self.config["Token"] = self.parser[self.CONFIG_CATEGORY]["Token"]
-        self.config["HardwareId"] = self.parser[self.CONFIG_CATEGORY]["HardwareId"]
+        with self._lock:
+            file_state = self._stat()
+            # a new parser, keys removed from the file must not survive a reload
+            parser = configparser.ConfigParser()
+            parser.read(self.config_path)
+
+        config = {}
+        config["Endpoint"] = parser[self.CONFIG_CATEGORY]["Endpoint"]
+        config["SetUp"] = parser.getboolean(self.CONFIG_CATEGORY, "SetUp")
+        config["Token"] = parser[self.CONFIG_CATEGORY]["Token"]
+        config["HardwareId"] = parser[self.CONFIG_CATEGORY]["HardwareId"]
+        # optional, e.g. "22:00-07:00"
+        config["QuietHours"] = parser.get(self.CONFIG_CATEGORY, "QuietHours", fallback="")
+        # optional, debounce time of the lid contact in seconds
+        config["BounceTime"] = parser.get(self.CONFIG_CATEGORY, "BounceTime", fallback="")
+        # optional, "file" or "http" to export metrics
+        config["Metrics"] = parser.get(self.CONFIG_CATEGORY, "Metrics", fallback="")
+        # optional, e.g. "DEBUG" or "WARNING"
+        config["LogLevel"] = parser.get(self.CONFIG_CATEGORY, "LogLevel", fallback="")
 
         # cleanup
-        self.config["Endpoint"] = self.config["Endpoint"].replace('"', "")
+        config["Endpoint"] = config["Endpoint"].replace('"', "")
 
-        return self.config
+        self.validate(config, strict)
+
+        self.parser = parser
+        self.config = config
+        self._file_state = file_state
+        return config
+
+    def validate(self, config: dict, strict: bool = False) -> None:
+        """Raises ValueError if a setting is invalid.
+
+        The optional settings (everything Messagebox._apply_config applies)
+        are only checked if strict: an edited file with a typo is rejected
+        as a whole, while the box still starts with one and logs it when the
+        setting is applied."""
+        if not self.is_host_valid(config["Endpoint"]):
+            raise ValueError("Invalid host")
+        if not strict:
+            return
+        if config["BounceTime"]:
+            parse_bounce_time(config["BounceTime"])
+        if config["LogLevel"] and not isinstance(logging.getLevelName(config["LogLevel"].strip().upper()), int):
+            raise ValueError("Invalid log level: " + config["LogLevel"])
+        parse_quiet_hours(config["QuietHours"])
+        exporter_mode(config["Metrics"])
 
     def write_config(self, config) -> None:
-        """Write the configuration file"""
+        """Write the configuration file, a power cut leaves either the old or the new one"""
         self.config = config
 
         self.parser[self.CONFIG_CATEGORY] = config
-        with open(self.dir_path + "/" + self.CONFIG_NAME, "w") as configfile:
-            self.parser.write(configfile)
+        text = io.StringIO()
+        self.parser.write(text)
+
+        with self._lock:
+            write_atomic(self.config_path, text.getvalue())
+            # written by the box itself, the watcher does not reload it
+            self._file_state = self._stat()
+
+    def watch(self, on_change, interval: float = CONFIG_WATCH_INTERVAL) -> None:
+        """Calls on_change(config) on a background thread whenever the file was edited.
+
+        Checks the modification time every interval seconds. An edited file
+        which does not validate is logged and ignored."""
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._stop_watching.clear()
+        self._watch_thread = threading.Thread(
+            target=self._watch, args=(on_change, interval), name="config-watcher", daemon=True
+        )
+        self._watch_thread.start()
+
+    def stop_watching(self) -> None:
+        self._stop_watching.set()
+
+    def load_settings(self) -> dict:
+        """Server settings of the last run, empty if there are none"""
+        try:
+            with open(self.settings_path) as file:
+                settings = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return {key: settings[key] for key in SETTINGS_KEYS if key in settings}
+
+    def save_settings(self, settings: dict) -> None:
+        directory = os.path.dirname(self.settings_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        write_atomic(self.settings_path, json.dumps({key: settings[key] for key in SETTINGS_KEYS if key in settings}))
+
+    def _watch(self, on_change, interval: float) -> None:
+        while not self._stop_watching.wait(interval):
+            with self._lock:
+                file_state = self._stat()
+                if file_state is None or file_state == self._file_state:
+                    continue
+                self._file_state = file_state
+
+            try:
+                config = self.load_config(strict=True)
+            except Exception as ex:
+                logging.error("Invalid config, keeping the current one: %s", ex)
+                continue
+
+            try:
+                on_change(config)
+            except Exception as ex:
+                logging.error("Applying the config failed: %s", ex)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+def parse_bounce_time(value: str) -> float:
+    """Debounce time of the lid contact in seconds, ValueError unless it is a positive number"""
+    bounce_time = float(value)
+    if not math.isfinite(bounce_time) or bounce_time <= 0:
+        raise ValueError("Invalid bounce time: " + value)
+    return bounce_time
+
+
+def write_atomic(path: str, text: str) -> None:
+    """Replaces a file through a synced temp file, readers never see a partial one"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+    # the rename is only durable once the directory is synced as well
+    directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
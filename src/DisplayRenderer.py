@@ -1,43 +1,103 @@
-import adafruit_rgb_display.st7735 as st7735
-import RPi.GPIO as GPIO
+import logging
+import os
+
 from PIL import Image, ImageColor, ImageDraw, ImageFont, ImageOps
-from const import MESSAGE_CHAR_LENGTH, FONT_FAMILY
-from image_utils import ImageText
+from const import CACHE_DIRECTORY, FONT_FAMILY, MESSAGE_MAX_FONT_SIZE, MESSAGE_MIN_FONT_SIZE, TEXT_BACKEND
+from FontCache import get_font
+from FontMetrics import metrics_registry
+from FrameCache import FrameCache
+from frame_utils import changed_rects, crop_rgb565, to_panel_orientation, to_rgb565
+from GlyphAtlas import GlyphAtlas
+from Metrics import metrics
+from image_utils import ImageText, line_height
+from ScreenBundle import ScreenBundle
 
 
 class DisplayRenderer:
-    def __init__(self, display):
+    def __init__(
+        self, display, backend: str = TEXT_BACKEND, swap_rb: bool = True, persist_frames: bool = True, shown_frame=None
+    ):
         self.display = display
-        self.display.fill(0)
+        if shown_frame is None:
+            self.display.fill(0)
+
+        # the panel expects BGR, the channels are swapped while converting the frame
+        # (see https://github.com/adafruit/Adafruit-ST7735-Library/issues/86#issuecomment-519164816)
+        self.swap_rb = swap_rb
 
-    def get_swaped_rdb(self, hex_color: str):
-        rgb = ImageColor.getrgb(str("#" + hex_color))
-        # need to swap r and b channel: (see https://github.com/adafruit/Adafruit-ST7735-Library/issues/86#issuecomment-519164816)
-        return (rgb[2], rgb[1], rgb[0])
+        # last frame pushed to the panel (RGB565, panel orientation), used to only send changes
+        # shown_frame is already on the panel, e.g. the splash drawn during startup
+        self.last_frame = shown_frame
+
+        # "atlas" composes text from cached glyph masks, "pillow" rasterizes with FreeType on every draw
+        self.backend = backend
+        self.atlas = GlyphAtlas() if backend == "atlas" else None
+
+        # finished panel frames of screens which were drawn before
+        if persist_frames:
+            frames_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), CACHE_DIRECTORY, "frames")
+        else:
+            frames_path = None
+        self.frame_cache = FrameCache(directory=frames_path, frame_bytes=display.width * display.height * 2)
+        try:
+            self.font_version = (FONT_FAMILY, os.stat(FONT_FAMILY).st_mtime)
+        except OSError:
+            self.font_version = (FONT_FAMILY, None)
+
+        try:
+            metrics_registry.load()
+        except OSError as ex:
+            logging.error("Font metrics not available: %s", ex)
+
+        # static screens are shown straight from the memory-mapped bundle
+        self.bundle = ScreenBundle(self)
+        try:
+            self.bundle.load()
+        except (OSError, ValueError) as ex:
+            logging.error("Screen bundle not available: %s", ex)
+
+    def warm_up(self) -> None:
+        """Loads the fonts of the message screen, the first message is not slowed down by it"""
+        for font_size in range(MESSAGE_MIN_FONT_SIZE, MESSAGE_MAX_FONT_SIZE + 1):
+            get_font(FONT_FAMILY, font_size)
+
+    def get_rgb(self, hex_color: str):
+        return ImageColor.getrgb(str("#" + hex_color))
 
     def draw_message_text(self, text: str, author: str, text_color: str = "ffffff", bg_color: str = "000000"):
-        text_rgb = self.get_swaped_rdb(text_color)
-        bg_rgb = self.get_swaped_rdb(bg_color)
+        self._draw(self.render_message_text, text, author, text_color, bg_color)
+
+    def draw_multi_line_center_text(self, text: str, font_size: int = 16, text_color: str = "white"):
+        self._draw(self.render_multi_line_center_text, text, font_size, text_color)
+
+    def draw_center_text(self, text: str, font_size: int = 16, text_color: str = "white"):
+        self._draw(self.render_center_text, text, font_size, text_color)
+
+    def render_message_text(self, text: str, author: str, text_color: str = "ffffff", bg_color: str = "000000"):
+        text_rgb = self.get_rgb(text_color)
+        bg_rgb = self.get_rgb(bg_color)
         width, height = self._display_dimensions()
         default_font_size = 14
-        font = ImageFont.truetype(FONT_FAMILY, default_font_size)
 
         image = Image.new("RGB", (width, height), bg_rgb)
-        image_text = ImageText(image)
-
-        chars = len(text)
-        fontsize = 13
-        if chars >= 120 and chars <= MESSAGE_CHAR_LENGTH:
-            fontsize = 12
-        elif chars > 80 and chars <= 120:
-            fontsize = 13
-        elif chars > 50 and chars <= 80:
-            fontsize = 15
-        elif chars <= 50:
-            fontsize = 18
+        image_text = ImageText(image, atlas=self.atlas)
+
+        author_text = "from " + author
+        author_y = height - line_height(FONT_FAMILY, default_font_size) - 2
+
+        # largest font size which fits the wrapped message above the author line
+        fontsize = image_text.fit_font_size(
+            text,
+            FONT_FAMILY,
+            max_width=width - 2,
+            max_height=author_y - 2,
+            wrap=True,
+            min_size=MESSAGE_MIN_FONT_SIZE,
+            max_size=MESSAGE_MAX_FONT_SIZE,
+        ) or MESSAGE_MIN_FONT_SIZE
 
         image_text.write_multi_line_text_box(
-            (2, -12),
+            (2, 2 - line_height(FONT_FAMILY, fontsize)),
             text,
             box_width=width - 2,
             font_filename=FONT_FAMILY,
@@ -46,12 +106,8 @@ class DisplayRenderer:
             justify_last_line=False,
         )
 
-        author_text = "from " + author
-        author_text_size_x, author_text_size_y = image_text.draw.textsize(
-            author_text, font=font
-        )
         image_text.write_text(
-            (2, height - author_text_size_y - 2),
+            (2, author_y),
             author_text,
             font_filename=FONT_FAMILY,
             font_size="fill",
@@ -60,13 +116,13 @@ class DisplayRenderer:
             color=text_rgb,
         )
 
-        self.display.image(image_text.image)
+        return image_text.image
 
-    def draw_multi_line_center_text(self, text: str, font_size: int = 16, text_color : str = "white"):
+    def render_multi_line_center_text(self, text: str, font_size: int = 16, text_color: str = "white"):
         width, height = self._display_dimensions()
         image, draw = self._get_draw()
 
-        image_text = ImageText(image)
+        image_text = ImageText(image, atlas=self.atlas)
         image_text.write_multi_line_text_box(
             (0, 0),
             text=text,
@@ -78,21 +134,18 @@ class DisplayRenderer:
             position="middle",
         )
 
-        self.display.image(image_text.image)
+        return image_text.image
 
-    def draw_center_text(self, text: str, font_size: int = 16, text_color : str = "white"):
+    def render_center_text(self, text: str, font_size: int = 16, text_color: str = "white"):
         width, height = self._display_dimensions()
         image, draw = self._get_draw()
 
-        font = ImageFont.truetype(FONT_FAMILY, font_size)
-        
-        textWidth, textHeight = draw.textsize(text, font=font)
-        screen_x  = (width - textWidth) / 2
-        screen_y = (height - textHeight) / 2
-
-        draw.text((screen_x, screen_y), text, font=font, fill=text_color)
+        image_text = ImageText(image, atlas=self.atlas)
+        image_text.write_text(
+            ("center", "center"), text, font_filename=FONT_FAMILY, font_size=font_size, color=text_color
+        )
 
-        self.display.image(image)
+        return image
 
     def _center_text(self, draw, text: str, font: ImageFont, text_color: str = "white") -> ImageFont:
         width, height = self._display_dimensions()
@@ -104,6 +157,63 @@ class DisplayRenderer:
         
         return draw
 
+    def draw_frame(self, buffer: bytes) -> None:
+        """Shows a frame which was rendered before (see render_frame)"""
+        self._write_frame(buffer, self.display.width, self.display.height)
+
+    def frame_version(self) -> str:
+        """Changes whenever frames rendered before do not match the display anymore"""
+        return FrameCache.key(
+            self.font_version, self.backend, self.swap_rb, self.display.rotation, self.display.width, self.display.height
+        )
+
+    def render_frame(self, render, *args) -> bytes:
+        """Panel frame of a render method, rendering it only if it is not cached"""
+        buffer = self.bundle.get(render.__name__, args)
+        if buffer is not None:
+            return buffer
+
+        key = FrameCache.key(
+            render.__name__, args, self.font_version, self.backend, self.swap_rb, self.display.rotation, self.display.width, self.display.height
+        )
+        buffer = self.frame_cache.get(key)
+        if buffer is None:
+            with metrics.timer("messagebox_render_seconds", screen=render.__name__):
+                buffer = self._to_panel(render(*args))
+            self.frame_cache.put(key, buffer)
+
+        return buffer
+
+    def _draw(self, render, *args) -> None:
+        self.draw_frame(self.render_frame(render, *args))
+
+    def _to_panel(self, image) -> bytes:
+        """Converts the frame to RGB565 in one pass, in the orientation of the panel"""
+        frame = to_panel_orientation(image, self.display.rotation)
+        return to_rgb565(frame, swap_rb=self.swap_rb)
+
+    def _write_frame(self, buffer: bytes, width: int, height: int) -> None:
+        """Sends only the rectangles which changed since the last frame"""
+        if self.last_frame is None or len(self.last_frame) != len(buffer):
+            rects = [(0, 0, width - 1, height - 1)]
+        else:
+            rects = changed_rects(self.last_frame, buffer, width, height)
+
+        if not rects:
+            logging.debug("Frame unchanged, skipped transfer")
+            return
+
+        sent = 0
+        with metrics.timer("messagebox_frame_write_seconds"):
+            for rect in rects:
+                data = crop_rgb565(buffer, width, rect)
+                # same windowed write display.image() ends with, minus its per-pixel conversion
+                self.display._block(*rect, data)
+                sent += len(data)
+
+        self.last_frame = buffer
+        logging.debug("Sent %d of %d bytes in %d rectangle(s)", sent, len(buffer), len(rects))
+
     def _display_dimensions(self):
         if self.display.rotation % 180 == 90:
             height = self.display.width
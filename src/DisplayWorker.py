@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from collections import deque
+
+
+class DisplayWorker:
+    """Renders and flushes frames on its own thread.
+
+    Requests go into a one-slot mailbox: a request which was not started
+    yet is replaced (and dropped) by a newer one, so only the latest
+    frame reaches the display. Background tasks (e.g. rendering ahead)
+    run in order whenever no frame is waiting."""
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+
+        self.frames = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+        self._pending = None
+        self._background = deque()
+        self._busy = False
+        self._running = True
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, name="display-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, draw, *args, **kwargs) -> None:
+        """Queues a draw call (e.g. renderer.draw_center_text) and returns immediately"""
+        with self._condition:
+            if self._pending is not None:
+                self.dropped += 1
+                logging.debug("Dropped stale frame: %s", self._pending[0].__name__)
+            self._pending = (draw, args, kwargs, time.monotonic())
+            self._condition.notify_all()
+
+    def submit_background(self, task, *args) -> None:
+        """Queues a task which runs on the worker thread once no frame is waiting"""
+        with self._condition:
+            self._background.append((task, args))
+            self._condition.notify_all()
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Blocks until every submitted frame is on the display"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def flush(self, timeout: float = None) -> bool:
+        return self.wait_idle(timeout)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "frames": self.frames,
+                "dropped": self.dropped,
+                "last_latency": self.last_latency,
+                "max_latency": self.max_latency,
+                "mean_latency": self.total_latency / self.frames if self.frames else 0.0,
+            }
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending is not None or self._background or not self._running
+                )
+                if self._pending is not None:
+                    task, args, kwargs, submitted_at = self._pending
+                    self._pending = None
+
+                    latency = time.monotonic() - submitted_at
+                    self.last_latency = latency
+                    self.max_latency = max(self.max_latency, latency)
+                    self.total_latency += latency
+                    self.frames += 1
+                elif self._running:
+                    task, args = self._background.popleft()
+                    kwargs = {}
+                else:
+                    return
+                self._busy = True
+
+            try:
+                task(*args, **kwargs)
+            except Exception as ex:
+                logging.error("Display task %s failed: %s", task.__name__, ex)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
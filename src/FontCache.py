@@ -0,0 +1,87 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+
+class FontCache:
+    """Process-wide registry of loaded FreeType fonts keyed by (path, size)."""
+
+    MAX_ENTRIES = 32
+    MAX_BYTES = 16 * 1024 * 1024  # 16 Megabyte
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, font_filename: str, font_size: int) -> ImageFont.FreeTypeFont:
+        key = (font_filename, int(font_size))
+
+        with self._lock:
+            entry = self._fonts.get(key)
+            if entry is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # load outside of the lock, parsing the font is the slow part
+        font = ImageFont.truetype(font_filename, int(font_size))
+        cost = self._font_cost(font_filename)
+
+        with self._lock:
+            if key not in self._fonts:
+                self._fonts[key] = (font, cost)
+                self.total_bytes += cost
+                self._evict()
+            return self._fonts[key][0] if key in self._fonts else font
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fonts.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._fonts),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _evict(self) -> None:
+        # always keep the most recently used font, even if it exceeds the budget
+        while len(self._fonts) > 1 and (
+            len(self._fonts) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            _, (_, cost) = self._fonts.popitem(last=False)
+            self.total_bytes -= cost
+            self.evictions += 1
+
+    def _font_cost(self, font_filename: str) -> int:
+        # the size of the font file is used as an upper bound of the face memory
+        try:
+            return os.path.getsize(font_filename)
+        except (OSError, TypeError):
+            return 0
+
+
+font_cache = FontCache()
+
+
+def get_font(font_filename: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """Returns the shared font instance for the given file and size"""
+    return font_cache.get(font_filename, font_size)
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from const import CACHE_DIRECTORY, FONT_FAMILY, FONT_METRICS_SIZES
+from FontCache import get_font
+
+# Basic Latin + Latin-1 Supplement + Latin Extended-A
+FIRST_CODEPOINT = 0x20
+LAST_CODEPOINT = 0x17F
+# kerning pairs are only looked up between printable ASCII characters
+KERNING_CHARS = "".join(chr(c) for c in range(0x21, 0x7F))
+
+FILE_MAGIC = b"FMTB"
+FILE_VERSION = 1
+
+
+class FontMetrics:
+    """Advance widths, kerning pairs and line height of one font at one size"""
+
+    def __init__(self, font_filename: str, font_size: int, first: int, advances: array, kerning: dict, line_height: int):
+        self.font_filename = font_filename
+        self.font_size = font_size
+        self.first = first
+        self.advances = advances
+        self.kerning = kerning
+        self.line_height = line_height
+
+    @classmethod
+    def build(cls, font_filename: str, font_size: int):
+        """Measures every covered codepoint and kerning pair with FreeType"""
+        font = get_font(font_filename, font_size)
+
+        advances = array("f", (font.getlength(chr(c)) for c in range(FIRST_CODEPOINT, LAST_CODEPOINT + 1)))
+
+        kerning = {}
+        for a in KERNING_CHARS:
+            advance_a = advances[ord(a) - FIRST_CODEPOINT]
+            for b in KERNING_CHARS:
+                kern = font.getlength(a + b) - advance_a - advances[ord(b) - FIRST_CODEPOINT]
+                if kern:
+                    kerning[a + b] = kern
+
+        return cls(font_filename, font_size, FIRST_CODEPOINT, advances, kerning, sum(font.getmetrics()))
+
+    def covers(self, text: str) -> bool:
+        first, count = self.first, len(self.advances)
+        return all(0 <= ord(ch) - first < count for ch in text)
+
+    def text_width(self, text: str) -> float:
+        """Returns the advance width of a single line, or None if a codepoint is not covered"""
+        advances, first, count = self.advances, self.first, len(self.advances)
+        kerning = self.kerning
+
+        width = 0.0
+        for i, ch in enumerate(text):
+            index = ord(ch) - first
+            if not 0 <= index < count:
+                return None
+            width += advances[index]
+            if i and kerning:
+                width += kerning.get(text[i - 1 : i + 1], 0)
+        return width
+
+
+class FontMetricsRegistry:
+    """Loads the metric tables of a font from disk and rebuilds them if they are outdated"""
+
+    FILE_NAME = "font_metrics.bin"
+
+    def __init__(self):
+        self.dir_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), CACHE_DIRECTORY)
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    @property
+    def file_path(self) -> str:
+        return os.path.join(self.dir_path, self.FILE_NAME)
+
+    def get(self, font_filename: str, font_size: int) -> FontMetrics:
+        return self.tables.get((font_filename, int(font_size)))
+
+    def load(self, font_filename: str = FONT_FAMILY, sizes=FONT_METRICS_SIZES) -> None:
+        """Loads the metric tables and builds them first if the file is missing or stale"""
+        with self._lock:
+            fingerprint = self._fingerprint(font_filename, sizes)
+            try:
+                tables = self._read(fingerprint)
+            except (OSError, ValueError, KeyError, TypeError, struct.error) as ex:
+                logging.info("Building font metrics (%s)", ex)
+                tables = [FontMetrics.build(font_filename, size) for size in sizes]
+                try:
+                    self._write(fingerprint, tables)
+                except OSError as ex:
+                    logging.error("Could not persist font metrics: %s", ex)
+
+            for table in tables:
+                self.tables[(table.font_filename, table.font_size)] = table
+
+    def _fingerprint(self, font_filename: str, sizes) -> dict:
+        stat = os.stat(font_filename)
+        return {
+            "version": FILE_VERSION,
+            "font": font_filename,
+            "font_mtime": int(stat.st_mtime),
+            "font_bytes": stat.st_size,
+            "sizes": list(sizes),
+            "first": FIRST_CODEPOINT,
+            "last": LAST_CODEPOINT,
+        }
+
+    def _read(self, fingerprint: dict) -> list:
+        with open(self.file_path, "rb") as file:
+            data = file.read()
+
+        if data[:4] != FILE_MAGIC:
+            raise ValueError("Invalid font metrics file")
+        (header_length,) = struct.unpack_from("<I", data, 4)
+        offset = 8 + header_length
+        header = json.loads(data[8:offset].decode("utf8"))
+
+        if header["fingerprint"] != fingerprint:
+            raise ValueError("Font metrics are outdated")
+
+        def section(length: int) -> bytes:
+            # a file cut short by a power loss must not load as shorter tables
+            nonlocal offset
+            if offset + length > len(data):
+                raise ValueError("Font metrics file is truncated")
+            offset += length
+            return data[offset - length : offset]
+
+        tables = []
+        for entry in header["tables"]:
+            advances = array("f")
+            advances.frombytes(section(entry["advances"] * 4))
+
+            pairs = section(entry["pairs"] * 8).decode("utf-32-le")
+            kerns = array("f")
+            kerns.frombytes(section(entry["pairs"] * 4))
+
+            kerning = {pairs[i * 2 : i * 2 + 2]: kerns[i] for i in range(entry["pairs"])}
+            tables.append(
+                FontMetrics(
+                    fingerprint["font"], entry["size"], fingerprint["first"], advances, kerning, entry["line_height"]
+                )
+            )
+        if offset != len(data):
+            raise ValueError("Font metrics file has %d unexpected bytes" % (len(data) - offset))
+        return tables
+
+    def _write(self, fingerprint: dict, tables: list) -> None:
+        if not os.path.exists(self.dir_path):
+            os.mkdir(self.dir_path)
+
+        header = {"fingerprint": fingerprint, "tables": []}
+        blobs = []
+        for table in tables:
+            pairs = list(table.kerning)
+            header["tables"].append(
+                {
+                    "size": table.font_size,
+                    "line_height": table.line_height,
+                    "advances": len(table.advances),
+                    "pairs": len(pairs),
+                }
+            )
+            blobs.append(table.advances.tobytes())
+            blobs.append("".join(pairs).encode("utf-32-le"))
+            blobs.append(array("f", (table.kerning[pair] for pair in pairs)).tobytes())
+
+        header_bytes = json.dumps(header).encode("utf8")
+        # replaced in one step, a power loss leaves the old or the new file
+        temp_path = self.file_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(FILE_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+            for blob in blobs:
+                file.write(blob)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.file_path)
+
+
+metrics_registry = FontMetricsRegistry()
+
+
+def get_metrics(font_filename: str, font_size: int) -> FontMetrics:
+    """Returns the loaded metric table or None if there is none for the font and size"""
+    return metrics_registry.get(font_filename, font_size)
+
+
+def verify(font_filename: str = FONT_FAMILY, sizes=FONT_METRICS_SIZES, corpus=None, registry=None) -> list:
+    """Compares the widths of the persisted tables, as the renderer loads them, with Pillow"""
+    if corpus is None:
+        corpus = [
+            "The quick brown fox jumps over the lazy dog",
+            "THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG",
+            "Schöne Grüße aus Köln! Wir sehen uns am Wochenende :)",
+            "AVAWAYAT To Ty Yo We Wa LT P. F, \"quoted\" (brackets) 0123456789",
+            "Ça va? Où est la fenêtre? Ærø, Łódź, Šibenik",
+        ]
+
+    if registry is None:
+        registry = metrics_registry
+    registry.load(font_filename, sizes)
+
+    mismatches = []
+    for size in sizes:
+        table = registry.get(font_filename, size)
+        font = get_font(font_filename, size)
+        for text in corpus:
+            expected = font.getlength(text)
+            actual = table.text_width(text) if table is not None else None
+            if actual is None or abs(actual - expected) > 0.5:
+                mismatches.append((size, text, expected, actual))
+    return mismatches
+
+
+if __name__ == "__main__":
+    if "--verify" in sys.argv:
+        mismatches = verify()
+        for size, text, expected, actual in mismatches:
+            print(f"size {size}: {text!r} expected {expected}, got {actual}")
+        print("OK" if not mismatches else f"{len(mismatches)} mismatches")
+        sys.exit(1 if mismatches else 0)
+
+    metrics_registry.load()
+    print(f"Font metrics written to {metrics_registry.file_path}")
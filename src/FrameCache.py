@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """LRU cache of finished panel frames, addressed by a hash of what was drawn"""
+
+    MAX_BYTES = 1024 * 1024  # 1 Megabyte, ~25 full frames
+    MAX_DISK_BYTES = 4 * 1024 * 1024  # 4 Megabyte
+    FILE_EXTENSION = ".rgb565"
+
+    def __init__(
+        self, max_bytes: int = MAX_BYTES, directory: str = None, max_disk_bytes: int = MAX_DISK_BYTES, frame_bytes: int = None
+    ):
+        self.max_bytes = max_bytes
+        # size of a full frame (width * height * 2), frames on disk of another size are discarded
+        self.frame_bytes = frame_bytes
+        self.total_bytes = 0
+
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.directory and not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha1(repr(parts).encode("utf8")).hexdigest()
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame
+
+        frame = self._read(key)
+
+        with self._lock:
+            if frame is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, frame)
+        return frame
+
+    def put(self, key: str, frame: bytes) -> None:
+        frame = bytes(frame)
+        with self._lock:
+            self._store(key, frame)
+        self._write(key, frame)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "frames": len(self._frames),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def _store(self, key: str, frame: bytes) -> None:
+        if key in self._frames:
+            self.total_bytes -= len(self._frames.pop(key))
+        self._frames[key] = frame
+        self.total_bytes += len(frame)
+        while len(self._frames) > 1 and self.total_bytes > self.max_bytes:
+            _, evicted = self._frames.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.FILE_EXTENSION)
+
+    def _read(self, key: str) -> bytes:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as file:
+                frame = file.read()
+            if self.frame_bytes is not None and len(frame) != self.frame_bytes:
+                # e.g. cut off by a power loss while it was written
+                logging.error("Discarding damaged frame %s (%d bytes)", key, len(frame))
+                os.remove(self._path(key))
+                return None
+            os.utime(self._path(key))  # keeps recently used frames when pruning
+            return frame
+        except OSError:
+            return None
+
+    def _write(self, key: str, frame: bytes) -> None:
+        if not self.directory:
+            return
+        try:
+            path = self._path(key)
+            with open(path + ".tmp", "wb") as file:
+                file.write(frame)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(path + ".tmp", path)
+            self._prune()
+        except OSError as ex:
+            logging.error("Could not persist frame: %s", ex)
+
+    def _prune(self) -> None:
+        """Removes the oldest frames on disk until the disk budget is met"""
+        entries = [
+            entry for entry in os.scandir(self.directory) if entry.name.endswith(self.FILE_EXTENSION)
+        ]
+        total = sum(entry.stat().st_size for entry in entries)
+        if total <= self.max_disk_bytes:
+            return
+
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.max_disk_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
@@ -0,0 +1,156 @@
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageChops, ImageDraw
+
+from FontCache import get_font
+from FontMetrics import KERNING_CHARS, get_metrics
+
+
+class GlyphAtlas:
+    """Rasterizes every (font, size, glyph) once and composes text from the cached alpha masks"""
+
+    MAX_BYTES = 2 * 1024 * 1024  # 2 Megabyte
+    LINE_SPACING = 4  # same spacing Pillow uses for multiline text
+    MAX_KERNING_PAIRS = 4096  # pairs outside the metric tables, measured on first use
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        self._glyphs = OrderedDict()
+        self._kerning = {}
+        self._lock = threading.Lock()
+
+    def glyph(self, font_filename: str, font_size: int, char: str):
+        """Returns the alpha mask and the advance width of a single glyph"""
+        key = (font_filename, font_size, char)
+
+        with self._lock:
+            entry = self._glyphs.get(key)
+            if entry is not None:
+                self._glyphs.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        font = get_font(font_filename, font_size)
+        metrics = get_metrics(font_filename, font_size)
+        advance = metrics.text_width(char) if metrics is not None else None
+        if advance is None:
+            advance = font.getlength(char)
+
+        # the ink can reach left of the pen or past the advance (j, f, italic overhang)
+        left, top, right, bottom = font.getbbox(char)
+        mask = None
+        if right > left and bottom > top and not char.isspace():
+            mask = Image.new("L", (right - left, bottom - top), 0)
+            ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+            # only keep the bounding box which actually has ink, offset from the pen position
+            bbox = mask.getbbox()
+            mask = (mask.crop(bbox), (left + bbox[0], top + bbox[1])) if bbox else None
+
+        entry = (mask, advance)
+        with self._lock:
+            # another thread may have rasterized the same glyph meanwhile
+            existing = self._glyphs.get(key)
+            if existing is not None:
+                return existing
+            self._glyphs[key] = entry
+            self.total_bytes += self._entry_cost(entry)
+            while len(self._glyphs) > 1 and self.total_bytes > self.max_bytes:
+                _, evicted = self._glyphs.popitem(last=False)
+                self.total_bytes -= self._entry_cost(evicted)
+        return entry
+
+    def draw_text(self, image, xy, text: str, font_filename: str, font_size: int, color) -> None:
+        """Composes the text into the image, pixel for pixel like ImageDraw.text without raqm"""
+        metrics = get_metrics(font_filename, font_size)
+
+        x, y = xy
+        # Pillow steps multiline text by the height of "A", not by the line height
+        line_step = get_font(font_filename, font_size).getbbox("A")[3] + self.LINE_SPACING
+        for index, line in enumerate(text.split("\n")):
+            top = y + index * line_step
+            # FreeType places every glyph on whole pixels, the fraction of the start in 1/64 pixels
+            origin_x, start_x = int(x), int(math.modf(x)[0] * 64)
+            origin_y = int(top) - (32 - int(math.modf(top)[0] * 64)) // 64
+
+            placed = []
+            pen = 0.0
+            previous = None
+            for char in line:
+                if previous is not None:
+                    pen += self.kerning(metrics, font_filename, font_size, previous + char)
+                mask, advance = self.glyph(font_filename, font_size, char)
+                if mask is not None:
+                    glyph_mask, (offset_x, offset_y) = mask
+                    left = origin_x + (start_x + round(pen * 64) + 32) // 64 + offset_x
+                    placed.append((glyph_mask, left, origin_y + offset_y))
+                pen += advance
+                previous = char
+
+            if placed:
+                self._paste_line(image, placed, color)
+
+    def kerning(self, metrics, font_filename: str, font_size: int, pair: str) -> float:
+        """Kerning of a pair, from the metric table if it covers the pair, else measured once"""
+        if metrics is not None and pair[0] in KERNING_CHARS and pair[1] in KERNING_CHARS:
+            return metrics.kerning.get(pair, 0)
+
+        key = (font_filename, font_size, pair)
+        kern = self._kerning.get(key)
+        if kern is None:
+            font = get_font(font_filename, font_size)
+            kern = font.getlength(pair) - font.getlength(pair[0]) - font.getlength(pair[1])
+            with self._lock:
+                if len(self._kerning) >= self.MAX_KERNING_PAIRS:
+                    self._kerning.clear()
+                self._kerning[key] = kern
+        return kern
+
+    def _paste_line(self, image, placed: list, color) -> None:
+        """Pastes the glyphs of a line, overlapping ink keeps the stronger coverage like FreeType does"""
+        right = placed[0][1]
+        for glyph_mask, x, _ in placed:
+            if x < right:
+                break
+            right = max(right, x + glyph_mask.size[0])
+        else:
+            # no glyph reaches into the previous one, every glyph is pasted as it is
+            for glyph_mask, x, y in placed:
+                image.paste(color, (x, y, x + glyph_mask.size[0], y + glyph_mask.size[1]), glyph_mask)
+            return
+
+        left = min(x for _, x, _ in placed)
+        top = min(y for _, _, y in placed)
+        right = max(x + mask.size[0] for mask, x, _ in placed)
+        bottom = max(y + mask.size[1] for mask, _, y in placed)
+
+        line_mask = Image.new("L", (right - left, bottom - top), 0)
+        for glyph_mask, x, y in placed:
+            box = (x - left, y - top, x - left + glyph_mask.size[0], y - top + glyph_mask.size[1])
+            line_mask.paste(ImageChops.lighter(line_mask.crop(box), glyph_mask), box)
+        image.paste(color, (left, top, right, bottom), line_mask)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "glyphs": len(self._glyphs),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _entry_cost(self, entry) -> int:
+        mask, _ = entry
+        if mask is None:
+            return 0
+        width, height = mask[0].size
+        return width * height
@@ -0,0 +1,87 @@
+import logging
+import queue
+import time
+
+from const import LID_BOUNCE_TIME, LID_RECHECK_INTERVAL
+
+OPENED = "opened"
+CLOSED = "closed"
+
+
+class LidSensor:
+    """Reed contact of the lid, delivered as edge events instead of polled.
+
+    gpiozero calls back on every debounced edge, the events go into a
+    queue which the state machine blocks on. The contact is closed (the
+    input active) while the lid is closed. A plain input device is used
+    instead of a Button, whose hold thread wakes up every 100ms. Waits
+    read the contact again every LID_RECHECK_INTERVAL, an edge which got
+    lost (e.g. dropped within the bounce time) delays them by that much."""
+
+    def __init__(self, pin: int, bounce_time: float = LID_BOUNCE_TIME, pin_factory=None):
+        # imported on first use, gpiozero loads its pin factories on import
+        from gpiozero import DigitalInputDevice
+
+        self.events = queue.Queue()
+        self.listeners = []
+        self.last_latency = 0.0
+
+        self.button = DigitalInputDevice(pin, pull_up=True, bounce_time=bounce_time, pin_factory=pin_factory)
+        self.button.when_activated = lambda: self._on_edge(CLOSED)
+        self.button.when_deactivated = lambda: self._on_edge(OPENED)
+
+    @property
+    def is_open(self) -> bool:
+        return not self.button.is_active
+
+    def set_bounce_time(self, bounce_time: float) -> None:
+        """Debounce time of the contact in seconds, None to disable"""
+        self.button.pin.bounce = bounce_time
+
+    def add_listener(self, callback) -> None:
+        """callback(event, edge_at) is called on the gpiozero thread for every edge.
+
+        Listeners replace the queue, wait_opened/wait_closed are not used then."""
+        self.listeners.append(callback)
+
+    def wait_opened(self, timeout: float = None) -> bool:
+        return self._wait(OPENED, timeout)
+
+    def wait_closed(self, timeout: float = None) -> bool:
+        return self._wait(CLOSED, timeout)
+
+    def _on_edge(self, event: str) -> None:
+        # runs on the gpiozero callback thread
+        edge_at = time.monotonic()
+        if not self.listeners:
+            self.events.put((event, edge_at))
+        for callback in self.listeners:
+            callback(event, edge_at)
+
+    def _wait(self, event: str, timeout: float = None) -> bool:
+        """Blocks until the lid is in the requested state, False on timeout"""
+        # edges from before the wait are outdated, the current state counts
+        while not self.events.empty():
+            self.events.get_nowait()
+        if self.is_open == (event == OPENED):
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = LID_RECHECK_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            try:
+                received, edge_at = self.events.get(timeout=wait)
+            except queue.Empty:
+                if self.is_open == (event == OPENED):
+                    logging.debug("Lid %s without an edge", event)
+                    return True
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                continue
+
+            if received == event:
+                self.last_latency = time.monotonic() - edge_at
+                logging.debug("Lid %s, handled after %.1fms", event, self.last_latency * 1000)
+                return True
@@ -0,0 +1,227 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, RotatingFileHandler
+
+from const import (LOG_FLUSH_INTERVAL, LOG_FLUSH_RECORDS, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_BURST,
+                   LOG_SAMPLE_INTERVAL)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the fields passed as extra={"fields": {...}}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + ".%03d" % record.msecs,
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Lets at most `burst` records of a message template through per interval.
+
+    Only records below WARNING are sampled. The first record of the next
+    interval carries the number of records which were dropped."""
+
+    def __init__(self, burst: int = LOG_SAMPLE_BURST, interval: float = LOG_SAMPLE_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.dropped = 0
+
+        self._windows = {}  # (logger, template) -> [start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or record.created - window[0] >= self.interval:
+                if window is not None and window[2]:
+                    record.suppressed = window[2]
+                if len(self._windows) > 1000:
+                    # concatenated messages make new templates
+                    self._windows.clear()
+                self._windows[key] = [record.created, 1, 0]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.dropped += 1
+            return False
+
+
+class LazyQueueHandler(QueueHandler):
+    """Enqueues records without formatting them, the listener thread does.
+
+    The message arguments are kept as they are, so they must not be changed
+    after logging. A full queue drops the record instead of blocking."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # tracebacks reference frames which are gone once the record is handled
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingHandler(MemoryHandler):
+    """Collects records and writes them in one go.
+
+    Flushes once `capacity` records are buffered, on a WARNING or when
+    the oldest buffered record is older than flush_interval seconds. The
+    age is checked when a record comes in and by the listener while the
+    queue is idle, see seconds_until_due."""
+
+    def __init__(self, target: logging.Handler, capacity: int = LOG_FLUSH_RECORDS,
+                 flush_interval: float = LOG_FLUSH_INTERVAL):
+        super().__init__(capacity, flushLevel=logging.WARNING, target=target, flushOnClose=True)
+        self.flush_interval = flush_interval
+        self.writes = 0
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return super().shouldFlush(record) or self.seconds_until_due() <= 0
+
+    def seconds_until_due(self) -> float:
+        """Seconds until the oldest buffered record has to be written, None if there is none"""
+        self.acquire()
+        try:
+            if not self.buffer:
+                return None
+            return self.buffer[0].created + self.flush_interval - time.time()
+        finally:
+            self.release()
+
+    def flush_due(self) -> None:
+        due = self.seconds_until_due()
+        if due is not None and due <= 0:
+            self.flush()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self.target and self.buffer:
+                # one write and one flush of the file for the whole batch
+                text = "".join(self.target.format(record) + self.target.terminator for record in self.buffer)
+                self.target.acquire()
+                try:
+                    if self.target.shouldRollover(self.buffer[-1]):
+                        self.target.doRollover()
+                    if self.target.stream is None:
+                        self.target.stream = self.target._open()
+                    self.target.stream.write(text)
+                    self.target.stream.flush()
+                finally:
+                    self.target.release()
+                self.writes += 1
+                self.buffer.clear()
+        except Exception:
+            self.handleError(self.buffer[-1])
+            self.buffer.clear()
+        finally:
+            self.release()
+
+
+class BlockingStopListener(QueueListener):
+    """Waits for room in a full queue to stop, instead of failing.
+
+    While the queue is idle it wakes up when a batch of the handlers is
+    due, so buffered records are written on a quiet box as well. Without
+    buffered records it blocks until the next one."""
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        while True:
+            due = [handler.seconds_until_due() for handler in self.handlers if isinstance(handler, BatchingHandler)]
+            due = [seconds for seconds in due if seconds is not None]
+            timeout = max(min(due), 0) if due and block else None
+            try:
+                return self.queue.get(block, timeout)
+            except queue.Empty:
+                if timeout is None:
+                    raise
+                for handler in self.handlers:
+                    if isinstance(handler, BatchingHandler):
+                        handler.flush_due()
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """Logging of the Messagebox, without file I/O on the logging threads.
+
+    Records are sampled and put into a queue, a listener thread formats
+    them as JSON lines into a rotating file in batches and as plain text
+    to stdout."""
+
+    def __init__(self, path: str, level: str = LOG_LEVEL, stream=sys.stdout):
+        self.queue = queue.Queue(LOG_QUEUE_SIZE)
+
+        file_handler = RotatingFileHandler(path, maxBytes=25000000, backupCount=2)  # 25 Megabyte
+        file_handler.setFormatter(JsonFormatter())
+        self.file_handler = BatchingHandler(file_handler)
+
+        stream_handler = logging.StreamHandler(stream)
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%y-%m-%d %H:%M:%S"))
+
+        self.sampler = SamplingFilter()
+        self.handler = LazyQueueHandler(self.queue)
+        self.handler.addFilter(self.sampler)
+        self.listener = BlockingStopListener(self.queue, self.file_handler, stream_handler)
+
+        self._started = False
+        self.set_level(level)
+
+    def start(self) -> None:
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        self.listener.start()
+        self._started = True
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Writes the queued records, e.g. before the process exits"""
+        if self._started:
+            self._started = False
+            self.listener.stop()
+        self.file_handler.flush()
+
+    def set_level(self, level: str) -> None:
+        """Level of the root logger by name, e.g. "DEBUG" or "WARNING".
+
+        Records below it are not created at all."""
+        value = logging.getLevelName((level or LOG_LEVEL).strip().upper())
+        if not isinstance(value, int):
+            raise ValueError("Unknown log level: " + level)
+        logging.getLogger().setLevel(value)
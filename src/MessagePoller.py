@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+
+import requests
+
+from NetworkManager import (InvalidResponseError, InvalidTokenError,
+                            StreamingUnsupportedError, UnauthenticatedError)
+from PollScheduler import PollScheduler
+
+
+class Snapshot:
+    """Messages and settings as seen by one poll (or push) of the backend"""
+
+    def __init__(self, response: dict = None, error: Exception = None, modified: bool = True):
+        self.sequence = 0
+        self.response = response
+        self.error = error
+        self.modified = modified
+        self.received_at = time.monotonic()
+
+    @property
+    def settings(self) -> dict:
+        if self.response and "settings" in self.response:
+            return self.response["settings"]
+        return {}
+
+
+class MessagePoller:
+    """Owns all fetching from the backend and publishes snapshots to its subscribers.
+
+    One thread polls every interval and one listens to the server push
+    stream. However many consumers there are, every interval costs
+    exactly one request."""
+
+    ERRORS = (
+        requests.ConnectionError,
+        requests.Timeout,
+        UnauthenticatedError,
+        InvalidResponseError,
+        InvalidTokenError,
+    )
+
+    def __init__(self, network, interval: int = 60):
+        self.network = network
+        self.scheduler = PollScheduler(interval)
+
+        self.snapshot = None
+        self.subscribers = []
+
+        self._sequence = 0
+        self._published = 0
+        self._paused = False
+        self._publish_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+        self._poll_thread = None
+        self._push_thread = None
+
+    @property
+    def interval(self) -> int:
+        return self.scheduler.interval
+
+    @interval.setter
+    def interval(self, interval: int) -> None:
+        self.scheduler.interval = interval
+
+    def note_activity(self) -> None:
+        """Polls more often for a while, e.g. after a message was read"""
+        self.scheduler.note_activity()
+
+    def subscribe(self, callback) -> None:
+        """callback(snapshot) is called on the poller thread for every new snapshot"""
+        self.subscribers.append(callback)
+
+    def start(self) -> None:
+        """Starts polling (again, e.g. after a new token was registered)"""
+        self._paused = False
+        self._stop.clear()
+
+        if self._poll_thread is None or not self._poll_thread.is_alive():
+            self._poll_thread = threading.Thread(target=self._run, name="message-poller", daemon=True)
+            self._poll_thread.start()
+        else:
+            self._wakeup.set()
+
+        if self._push_thread is None or not self._push_thread.is_alive():
+            self._push_thread = threading.Thread(target=self._listen, name="message-stream", daemon=True)
+            self._push_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def poll_now(self) -> None:
+        """Polls immediately instead of waiting for the rest of the interval"""
+        self._wakeup.set()
+
+    def is_running(self) -> bool:
+        return self._poll_thread is not None and self._poll_thread.is_alive()
+
+    def wait_for_snapshot(self, after_sequence: int, timeout: float = None) -> Snapshot:
+        """Blocks until there is a snapshot newer than after_sequence, returns None on timeout"""
+        with self._condition:
+            if self._condition.wait_for(lambda: self._published > after_sequence, timeout):
+                return self.snapshot
+        return None
+
+    def _run(self) -> None:
+        self._wakeup.wait(self.scheduler.first_delay())
+        self._wakeup.clear()
+
+        while not self._stop.is_set():
+            try:
+                if self._paused:
+                    self._wakeup.wait()
+                else:
+                    snapshot = self._poll()
+                    self._wakeup.wait(self._next_interval(snapshot))
+            except Exception:
+                # the state machine waits for snapshots, the thread must not end
+                logging.exception("Polling failed")
+                self._wakeup.wait(self.scheduler.next_delay(error=True)[0])
+            self._wakeup.clear()
+
+    def _poll(self) -> Snapshot:
+        try:
+            response = self.network.fetch_messages()
+            snapshot = Snapshot(response, modified=not self.network.not_modified)
+        except self.ERRORS as ex:
+            snapshot = Snapshot(error=ex)
+            if isinstance(ex, (UnauthenticatedError, InvalidTokenError)):
+                # no point in polling with this token until the box registered again
+                self._paused = True
+        except (requests.RequestException, ValueError, TypeError) as ex:
+            # e.g. an HTML page of a captive portal, a broken or not decodable body
+            snapshot = Snapshot(error=InvalidResponseError("InvalidResponseError: %s: %s" % (type(ex).__name__, ex)))
+
+        self._publish(snapshot)
+        return snapshot
+
+    def _next_interval(self, snapshot: Snapshot) -> float:
+        delay, reason = self.scheduler.next_delay(snapshot.error is not None, self.network.streaming)
+        logging.info("Next poll in %.1fs (%s)", delay, reason)
+        return delay
+
+    def _listen(self) -> None:
+        try:
+            self.network.listen_messages(self._on_push, self._stop)
+        except StreamingUnsupportedError:
+            logging.info("Server push not supported, polling every fetch interval")
+        except UnauthenticatedError:
+            logging.error("Message stream unauthenticated")
+
+    def _on_push(self, response: dict) -> None:
+        logging.info("Server push received")
+        if response is None:
+            self.poll_now()
+        else:
+            self._publish(Snapshot(response))
+
+    def _publish(self, snapshot: Snapshot) -> None:
+        # subscribers see the snapshot before anyone waiting for it wakes up
+        with self._publish_lock:
+            self._sequence += 1
+            snapshot.sequence = self._sequence
+
+            for callback in self.subscribers:
+                try:
+                    callback(snapshot)
+                except Exception as ex:
+                    logging.error("Snapshot subscriber failed: %s", ex)
+
+            with self._condition:
+                self.snapshot = snapshot
+                self._published = snapshot.sequence
+                self._condition.notify_all()
@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import threading
+import time
+
+from const import DATA_DIRECTORY, DATABASE_NAME
+
+
+class MessageStore:
+    """Received messages, their read state and their pre-rendered panel frames.
+
+    The backend decides which messages are pending, the store remembers
+    them across restarts and keeps the frames rendered ahead of time, so a
+    message can be shown before the first request after a reboot."""
+
+    KEEP_READ = 50  # read messages which are kept as history
+
+    def __init__(self, path: str = None):
+        if path is None:
+            dir_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), DATA_DIRECTORY)
+            if not os.path.exists(dir_path):
+                os.mkdir(dir_path)
+            path = os.path.join(dir_path, DATABASE_NAME)
+
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY,"
+                " text TEXT NOT NULL,"
+                " author TEXT NOT NULL,"
+                " text_color TEXT NOT NULL,"
+                " background_color TEXT NOT NULL,"
+                " received_at REAL NOT NULL,"
+                " read_at REAL,"
+                " frame BLOB,"
+                " frame_version TEXT)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS messages_unread ON messages (read_at, received_at)"
+            )
+
+    def sync(self, response: dict) -> list:
+        """Stores the messages of a backend response, returns the ids which are new.
+
+        Unread messages which the backend does not list anymore are removed."""
+        messages = response.get("messages")
+        if messages is None:
+            message = response.get("message")
+            messages = [message] if message else []
+
+        now = time.time()
+        new_ids = []
+        with self._lock, self.connection:
+            for message in messages:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO messages"
+                    " (id, text, author, text_color, background_color, received_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        message["id"],
+                        message["text"],
+                        message["author"]["name"],
+                        message["text_color"],
+                        message["background_color"],
+                        now,
+                    ),
+                )
+                if cursor.rowcount:
+                    new_ids.append(message["id"])
+
+            ids = [message["id"] for message in messages]
+            self.connection.execute(
+                "DELETE FROM messages WHERE read_at IS NULL AND id NOT IN (%s)" % ",".join("?" * len(ids)),
+                ids,
+            )
+        return new_ids
+
+    def next_unread(self) -> dict:
+        """Oldest unread message in the format of the backend, or None"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT id, text, author, text_color, background_color FROM messages"
+                " WHERE read_at IS NULL ORDER BY received_at, id LIMIT 1"
+            ).fetchone()
+        return self._message(row) if row else None
+
+    def unread_without_frame(self, frame_version: str, limit: int) -> list:
+        """Unread messages which still have to be rendered, oldest first"""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT id, text, author, text_color, background_color FROM messages"
+                " WHERE read_at IS NULL AND (frame IS NULL OR frame_version != ?)"
+                " ORDER BY received_at, id LIMIT ?",
+                (frame_version, limit),
+            ).fetchall()
+        return [self._message(row) for row in rows]
+
+    def mark_read(self, message_id: int) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "UPDATE messages SET read_at = ?, frame = NULL, frame_version = NULL WHERE id = ?",
+                (time.time(), message_id),
+            )
+            # history is only kept for the latest messages
+            self.connection.execute(
+                "DELETE FROM messages WHERE read_at IS NOT NULL AND id NOT IN"
+                " (SELECT id FROM messages WHERE read_at IS NOT NULL ORDER BY read_at DESC LIMIT ?)",
+                (self.KEEP_READ,),
+            )
+
+    def frame(self, message_id: int, frame_version: str) -> bytes:
+        """Pre-rendered frame of a message, None if it was not rendered for this display"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT frame FROM messages WHERE id = ? AND frame_version = ?", (message_id, frame_version)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_frame(self, message_id: int, frame: bytes, frame_version: str) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "UPDATE messages SET frame = ?, frame_version = ? WHERE id = ? AND read_at IS NULL",
+                (bytes(frame), frame_version, message_id),
+            )
+
+    def _message(self, row) -> dict:
+        message_id, text, author, text_color, background_color = row
+        return {
+            "id": message_id,
+            "text": text,
+            "author": {"name": author},
+            "text_color": text_color,
+            "background_color": background_color,
+        }
@@ -1,24 +1,30 @@
-import json
 import logging
 import os
 import random
+import sqlite3
 import string
-import sys
 import threading
 import time
+from concurrent import futures
 from enum import Enum
-from logging.handlers import RotatingFileHandler
 
 import requests
 
-from gpiozero import Button
+from ServoMotion import MotionEngine, build_profile
 from ServoMotor import ServoMotor
 
-from const import HARDWARE_ID_LENGTH, SERVO_ROTATION_SPEED
-from ConfigHandler import ConfigHandler
+from const import HARDWARE_ID_LENGTH, SNAPSHOT_WAIT_TIMEOUT
+from ConfigHandler import SETTINGS_KEYS, ConfigHandler, parse_bounce_time
 from DisplayRenderer import DisplayRenderer
+from DisplayWorker import DisplayWorker
+from LidSensor import LidSensor
+from LogPipeline import LogPipeline
+from MessagePoller import MessagePoller
+from MessageStore import MessageStore
+from Metrics import metrics
 from NetworkManager import (InvalidResponseError, InvalidTokenError,
                             NetworkManager, UnauthenticatedError)
+from ReceiptOutbox import ReceiptOutbox
 
 
 class State(Enum):
@@ -31,86 +37,173 @@ class State(Enum):
 
 class Messagebox(object):
 
-    def __init__(self, display, trigger_pin: int, servo_pin: int):
+    # handler method of every state, each returns the next state
+    HANDLERS = {
+        State.LOAD_CONFIG: "load_config",
+        State.REGISTER_DEVICE: "register_state",
+        State.FETCH_MESSAGES: "fetch_messages_state",
+        State.NOTIFY: "notify_state",
+        State.READING: "reading_state",
+    }
+
+    # errors a state can end with: (exceptions, next state, recovery method, seconds until the next state)
+    RECOVERY = {
+        State.REGISTER_DEVICE: (
+            ((requests.ConnectionError, requests.Timeout), State.REGISTER_DEVICE, "_on_register_error", 10),
+        ),
+        State.FETCH_MESSAGES: (
+            ((requests.ConnectionError, requests.Timeout), State.FETCH_MESSAGES, "_on_connection_error", 0),
+            ((UnauthenticatedError,), State.REGISTER_DEVICE, "_on_unauthenticated", 0),
+            ((InvalidResponseError,), State.FETCH_MESSAGES, "_on_invalid_response", 0),
+            ((InvalidTokenError,), State.REGISTER_DEVICE, "_on_invalid_token", 0),
+        ),
+        State.READING: (
+            ((sqlite3.Error,), State.READING, "_on_storage_error", 5),
+        ),
+    }
+
+    def __init__(self, display, trigger_pin: int, servo_pin: int, splash_frame: bytes = None):
 
         self.setup_logging()
         self.config = {}
+        # the config watcher replaces the config while the states run
+        self._config_lock = threading.Lock()
         self.last_message = {}
 
         self.muted = False
         self.rotation_count = 1
         self.fetch_interval = 60
         self.rotation_interval = 30
-        
-        self.servo_thread = None
 
         self.network = NetworkManager(None)
+
+        # the only component which fetches from the backend
+        self.poller = MessagePoller(self.network, self.fetch_interval)
+        self.poller.subscribe(self._on_snapshot)
+        self.snapshot_sequence = 0
+        # server settings as they were saved for the next start
+        self._saved_settings = {}
+
+        # read receipts are stored locally and sent in the background
+        self.outbox = ReceiptOutbox(self.network, on_flushed=self._on_receipts_sent)
+        # messages survive restarts and are rendered before they are shown
+        self.store = MessageStore()
         self.config_handler = ConfigHandler()
 
+        # the config and the renderer (fonts, screen bundle) load while the GPIO devices are set up
+        startup = futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="init")
+        self._preloaded_config = startup.submit(self._preload_config)
+        renderer = startup.submit(DisplayRenderer, display, shown_frame=splash_frame)
+        startup.shutdown(wait=False)
+
         self.display = display
-        self.display_renderer = DisplayRenderer(display)
-        self.button = Button(trigger_pin)
+        self.lid = LidSensor(trigger_pin)
         self.servo = ServoMotor(servo_pin)
+        self.motion = MotionEngine(self.servo)
+        self.display_renderer = renderer.result()
+        self.screen = DisplayWorker(self.display_renderer)
 
         self.current_state = State.LOAD_CONFIG
-        
-        self.display_renderer.draw_multi_line_center_text("MESSAGEBOX", 18)
-        time.sleep(3)
+
+        metrics.gauge(
+            "messagebox_display_frames_dropped", "Frames replaced before they were drawn", lambda: self.screen.dropped
+        )
+        metrics.gauge(
+            "messagebox_log_records_dropped",
+            "Log records dropped because the log queue was full",
+            lambda: self.log_pipeline.handler.dropped,
+        )
+        metrics.gauge(
+            "messagebox_frame_cache_hit_ratio",
+            "Share of frames which did not have to be rendered",
+            lambda: self.display_renderer.frame_cache.stats()["hit_ratio"],
+        )
+        metrics.gauge("messagebox_receipts_pending", "Read receipts not acknowledged yet", self.outbox.pending_count)
+        metrics.gauge(
+            "messagebox_http_requests_reused",
+            "Requests which reused a pooled connection",
+            lambda: self.network.connection_stats()["reused"],
+        )
+
+        # the splash stays until the first real screen replaces it
+        if splash_frame is None:
+            self.screen.submit(self.display_renderer.draw_multi_line_center_text, "MESSAGEBOX", 18)
+        self.screen.submit_background(self.display_renderer.warm_up)
 
     def setup_logging(self) -> None:
 
         if not os.path.exists("logs"):
             os.mkdir("logs")
 
-        rfh = logging.handlers.RotatingFileHandler(
-            filename="logs/messagebox.log",
-            mode="a",
-            maxBytes=25000000,  # 25 Megabyte
-            backupCount=2,
-            encoding=None,
-            delay=0,
-        )
-        logging.basicConfig(
-            format="%(asctime)s [%(levelname)s] %(message)s",
-            level=logging.DEBUG,
-            datefmt="%y-%m-%d %H:%M:%S",
-            handlers=[rfh],
-        )
-        logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+        self.log_pipeline = LogPipeline("logs/messagebox.log")
+        self.log_pipeline.start()
 
     def run(self) -> None:
         logging.info("Messagebox started")
 
         while True:
-            if self.current_state is State.LOAD_CONFIG:
-                self.current_state = self.load_config()
+            self.current_state = self.step(self.current_state)
+            logging.info("Current State: %s", self.current_state)
 
-            elif self.current_state is State.REGISTER_DEVICE:
-                self.current_state = self.register_state()
+    def run_async(self) -> None:
+        """Runs the states on an asyncio event loop instead of blocking calls"""
+        from AsyncRuntime import AsyncRuntime
 
-            elif self.current_state is State.NOTIFY:
-                self.current_state = self.notify_state()
+        AsyncRuntime(self).run()
 
-            elif self.current_state is State.READING:
-                self.current_state = self.reading_state()
+    def step(self, state: State) -> State:
+        """Runs the handler of a state and returns the next state.
 
-            elif self.current_state is State.FETCH_MESSAGES:
-                self.current_state = self.fetch_messages_state()
-
-            logging.info("Current State: " + str(self.current_state))
+        Errors listed in RECOVERY for the state are handled here and lead to
+        the declared next state, everything else is raised."""
+        handler = getattr(self, self.HANDLERS[state])
+        try:
+            with metrics.timer("messagebox_state_seconds", state=state.name):
+                return handler()
+        except Exception as ex:
+            recovery = self.recover(state, ex)
+            if recovery is None:
+                raise
+            next_state, delay = recovery
+            time.sleep(delay)
+            return next_state
+
+    def recover(self, state: State, ex: Exception):
+        """Handles an error declared in RECOVERY, returns (next state, delay) or None"""
+        for exceptions, next_state, recover, delay in self.RECOVERY.get(state, ()):
+            if isinstance(ex, exceptions):
+                metrics.inc("messagebox_state_errors_total", state=state.name, error=type(ex).__name__)
+                getattr(self, recover)(ex)
+                return next_state, delay
+        return None
 
     def generate_hardware_id(self) -> str:
         return "".join(random.choice(string.digits) for i in range(HARDWARE_ID_LENGTH))
 
+    def wait_config(self, timeout: float = None) -> None:
+        """Blocks until the config was read in the background"""
+        if self._preloaded_config is not None:
+            futures.wait([self._preloaded_config], timeout)
+
+    def _preload_config(self):
+        """Reads the config during startup, None if there is none yet"""
+        if not self.config_handler.config_exists():
+            return None
+        return self.config_handler.load_config()
+
     def load_config(self):
         """Loads the config"""
         logging.info("Loading config file")
 
+        # read during startup, it is only used once
+        preloaded, self._preloaded_config = self._preloaded_config, None
+
         # Exit because no endpoint is set.
         if not self.config_handler.config_exists():
             self.config_handler.create_config()
 
-        self.config = self.config_handler.load_config()
+        config = preloaded.result() if preloaded is not None else None
+        self.config = config or self.config_handler.load_config()
 
         if not self.config["Endpoint"]:
             logging.critical("API-Server not found")
@@ -120,39 +213,79 @@ class Messagebox(object):
             self.config["HardwareId"] = self.generate_hardware_id()
             logging.info("Generating Hardware ID:" + self.config["HardwareId"])
 
-        self.network.endpoint = self.config["Endpoint"]
-        self.network.token = self.config["Token"]
+        self.network.configure(self.config["Endpoint"], self.config["Token"])
+        self._apply_config()
 
         logging.info("Endpoint: " + str(self.network.endpoint))
         logging.info("Token: " + str(self.network.token))
 
+        # the intervals of the last run count until the first response arrives
+        self._saved_settings = self.config_handler.load_settings()
+        self._apply_settings(self._saved_settings)
+        self.config_handler.watch(self._on_config_changed)
+
         if self.config["SetUp"]:
+            self._show_stored_message()
+            self.poller.start()
+            self.outbox.start()
             return State.FETCH_MESSAGES
     
         return State.REGISTER_DEVICE
 
+    def _apply_config(self) -> None:
+        """Applies the optional settings of the config, at start and after every edit"""
+        try:
+            metrics.start_exporter(self.config["Metrics"])
+        except OSError as ex:
+            logging.error("Metrics exporter not available: %s", ex)
+
+        try:
+            self.log_pipeline.set_level(self.config["LogLevel"])
+        except ValueError as ex:
+            logging.error(str(ex))
+
+        if self.config["BounceTime"]:
+            try:
+                self.lid.set_bounce_time(parse_bounce_time(self.config["BounceTime"]))
+            except ValueError:
+                logging.error("Invalid bounce time: " + self.config["BounceTime"])
+
+        self.poller.scheduler.seed(self.config["HardwareId"])
+        try:
+            self.poller.scheduler.set_quiet_hours(self.config["QuietHours"])
+        except ValueError:
+            logging.error("Invalid quiet hours: " + self.config["QuietHours"])
+
+    def _on_config_changed(self, config: dict) -> None:
+        """Applies an edited config.ini without a restart (runs on the config watcher thread)"""
+        logging.info("Config file changed, applying it")
+        with self._config_lock:
+            if not config["HardwareId"]:
+                # generated at start, it is written with the token
+                config["HardwareId"] = self.config["HardwareId"]
+
+            credentials_changed = (config["Endpoint"], config["Token"]) != (self.config["Endpoint"], self.config["Token"])
+            self.config = config
+            self._apply_config()
+            if credentials_changed:
+                logging.info("Endpoint: " + config["Endpoint"])
+                self.network.configure(config["Endpoint"], config["Token"])
+
+        if credentials_changed and config["SetUp"]:
+            # resumes polling if the old token was rejected, and polls right away
+            self.poller.start()
+
     def register_state(self):
         """Registers the box in the backend to receive messages"""
         logging.info("Register box...")
 
-        hardware_id = self.config["HardwareId"]
-        print("Hardware ID:" + hardware_id)
-
-        # add space after every 3rd number 
-        id_text = str(" ".join(a + b + c for a, b, c in zip(hardware_id[::3], hardware_id[1::3], hardware_id[2::3])))
-        self.display_renderer.draw_center_text(f"Personal ID:\n{id_text}", 18)
-
-        token = self.network.register_device(hardware_id)
+        self._show_hardware_id()
+        token = self.network.register_device(self.config["HardwareId"])
 
         if token:
-            logging.info("Received token: " + token)
-            self.network.token = token
-            self.config["SetUp"] = True
-            self.config["Token"] = token
-            self.config_handler.write_config(self.config)
+            self._registered(token)
+            self.screen.wait_idle()
 
-            self.display_renderer.draw_multi_line_center_text("DEVICE REGISTERED", 18)
-            
             time.sleep(3)
 
             return State.FETCH_MESSAGES
@@ -164,144 +297,227 @@ class Messagebox(object):
     def fetch_messages_state(self):
         """Fetchs for new messages"""
         logging.info("Fetching messages...")
+        logging.debug("Display worker: " + str(self.screen.stats()))
+        logging.debug("Network: " + str(self.network.connection_stats()))
 
-        try:
-            if self.last_message and not self.muted:
-                if "message" in self.last_message:
-                    if len(self.last_message["message"]) > 0:
-                        return State.NOTIFY
+        if self._has_message_to_notify():
+            return State.NOTIFY
 
-            self.last_message = self._fetch_messages()
+        snapshot = self.poller.wait_for_snapshot(self.snapshot_sequence, SNAPSHOT_WAIT_TIMEOUT)
+        if snapshot is None:
+            return self._on_snapshot_timeout()
+        return self._apply_snapshot(snapshot)
 
-            if self.last_message:
-                if self.muted:
-                    self.display_renderer.draw_multi_line_center_text("DEVICE MUTED", 18)
-                else:
-                    self.display_renderer.draw_multi_line_center_text("NO MESSAGES", 18)
+    def notify_state(self):
+        """Notifies the user by rotating the servo motor"""
+        logging.info("Notify user...")
 
-                if "message" in self.last_message:
-                    logging.info("Last message: " + json.dumps(self.last_message))
+        if not self.muted:
+            logging.info("Rotating servo")
+            self.motion.play(build_profile(self.rotation_count), repeat_every=self.rotation_interval)
 
-                    msg_obj = self.last_message["message"]
-                    if len(msg_obj) > 0:
-                        message_text = msg_obj["text"]
-                        author = msg_obj["author"]["name"]
-                        text_color = msg_obj["text_color"]
-                        bg_color = msg_obj["background_color"]
-                        
-                        self.display_renderer.draw_message_text(
-                            message_text, author, text_color, bg_color
-                        )
+        # the next message is rendered while the user opens the box
+        self._render_ahead()
 
-                        if self.muted:
-                            return State.FETCH_MESSAGES
+        self.lid.wait_opened()
+        self.motion.cancel()
+        logging.info("Box opend")
 
-                        return State.NOTIFY
+        return State.READING
 
-            time.sleep(self.fetch_interval)
+    def reading_state(self):
+        """Waits till the user opens the box and sends a request"""
+        logging.info("Sending reading request")
 
-            return State.FETCH_MESSAGES
-        except requests.ConnectionError as ex:
-            logging.error("No Connection... try again")
-            logging.error(ex)
+        if self._read_message():
+            # wait till box is closed
+            logging.info("Waiting for box is closed")
+            self.lid.wait_closed()
+            logging.info("Box closed!")
 
-            self.display_renderer.draw_center_text("No connection")
-            time.sleep(5)
+        return State.FETCH_MESSAGES
 
-            self.current_state = State.FETCH_MESSAGES
-            self.run()
+    def _show_hardware_id(self) -> None:
+        hardware_id = self.config["HardwareId"]
+        print("Hardware ID:" + hardware_id)
 
-        except UnauthenticatedError:
-            logging.error("Unauthenticated")
+        # add space after every 3rd number 
+        id_text = str(" ".join(a + b + c for a, b, c in zip(hardware_id[::3], hardware_id[1::3], hardware_id[2::3])))
+        self.screen.submit(self.display_renderer.draw_center_text, f"Personal ID:\n{id_text}", 18)
 
-            self.current_state = State.REGISTER_DEVICE
-            self.run()
+    def _registered(self, token: str) -> None:
+        logging.info("Received token: " + token)
+        # the network already uses the token, register_device stored it
+        with self._config_lock:
+            self.config["SetUp"] = True
+            self.config["Token"] = token
+            self.config_handler.write_config(self.config)
+        self.poller.start()
+        self.outbox.start()
 
-        except InvalidResponseError as ex:
-            logging.error("Invalid Response: " + ex)
+        self.screen.submit(self.display_renderer.draw_multi_line_center_text, "DEVICE REGISTERED", 18)
 
-            self.current_state = State.FETCH_MESSAGES
-            self.run()
-        
-        except InvalidTokenError:
-            logging.error("Invalid Token")
+    def _has_message_to_notify(self) -> bool:
+        if self.last_message and not self.muted:
+            if "message" in self.last_message:
+                if len(self.last_message["message"]) > 0:
+                    return True
+        return False
 
-            self.current_state = State.REGISTER_DEVICE
-            self.run()
+    def _apply_snapshot(self, snapshot) -> State:
+        """Shows the state of a snapshot and returns the next state"""
+        self.snapshot_sequence = snapshot.sequence
+        if snapshot.error is not None:
+            raise snapshot.error
 
+        # the store knows which messages were read but are not acknowledged yet
+        message = self.store.next_unread()
+        self.last_message = dict(snapshot.response, message=message or {})
 
-    def notify_state(self):
-        """Notifies the user by rotating the servo motor"""
-        logging.info("Notify user...")
+        if self.last_message:
+            if self.muted:
+                self.screen.submit(self.display_renderer.draw_multi_line_center_text, "DEVICE MUTED", 18)
+            else:
+                self.screen.submit(self.display_renderer.draw_multi_line_center_text, "NO MESSAGES", 18)
 
-        self.servo_thread = threading.Thread(target=self._rotate_servo, args=())
-        self.servo_thread.start()
-        self.servo_thread.do_run = True
+            if "message" in self.last_message:
+                # serialized on the log thread, and only if the record is not sampled out
+                logging.info("Last message", extra={"fields": {"response": self.last_message}})
 
-        while True:
-            if not self.button.is_pressed:
-                self.servo_thread.do_run = False
-                logging.info("Box opend")
+                msg_obj = self.last_message["message"]
+                if len(msg_obj) > 0:
+                    self._show_message(msg_obj)
 
-                return State.READING
-            time.sleep(0.1)
+                    if self.muted:
+                        return State.FETCH_MESSAGES
 
-    def reading_state(self):
-        """Waits till the user opens the box and sends a request"""
-        logging.info("Sending reading request")
+                    return State.NOTIFY
+
+        return State.FETCH_MESSAGES
+
+    def _on_snapshot_timeout(self) -> State:
+        """No new snapshot for a while: restarts a stopped poller and shows the last error again"""
+        if not self.poller.is_running():
+            logging.error("Message poller stopped, restarting it")
+            self.poller.start()
+
+        snapshot = self.poller.snapshot
+        if snapshot is not None and snapshot.error is not None:
+            # handled by RECOVERY like a new one, without the traceback of the last raise
+            raise snapshot.error.with_traceback(None)
+        return State.FETCH_MESSAGES
 
+    def _read_message(self) -> bool:
+        """Marks the shown message as read, False if there is none"""
         if self.last_message:
             if "message" in self.last_message:
                 if len(self.last_message["message"]) > 0:
                     message_id = self.last_message["message"]["id"]
-                    self.network.read_message(message_id)
+                    # receipt first, a message marked read locally is never shown again
+                    # and its receipt must not get lost if the second write fails
+                    self.outbox.add(message_id)
+                    self.store.mark_read(message_id)
+                    self.poller.note_activity()
                     self.last_message = {}
-
-                    # wait till box is closed
-                    logging.info("Waiting for box is closed")
-                    while True:
-                        if self.button.is_pressed:
-                            logging.info("Box closed!")
-
-                            return State.FETCH_MESSAGES
-                        time.sleep(0.1)
-
-        return State.FETCH_MESSAGES
-
-    def _rotate_servo(self):
-        if self.servo:
-            self.servo.rotate(0)
-
-            logging.info("Rotating servo")
-            while getattr(self.servo_thread, "do_run", True):
-                muted = False
-                response = self._fetch_messages()
-                if response:
-                    if "mute" in response["settings"]:
-                        muted = bool(response["settings"]["mute"])
-
-                if not muted:
-                    for i in range(self.rotation_count):
-                        time.sleep(SERVO_ROTATION_SPEED)
-                        self.servo.rotate(180)
-                        time.sleep(SERVO_ROTATION_SPEED)
-                        self.servo.rotate(0)
-                        time.sleep(SERVO_ROTATION_SPEED)
-                
-                time.sleep(self.rotation_interval)
-
-    def _fetch_messages(self):
-        response = self.network.fetch_messages()
-        if response:
-            if "settings" in response:
-                settings = response["settings"]
-                if "mute" in settings:
-                    self.muted = bool(settings["mute"])
-                if "rotation_count" in settings:
-                    self.rotation_count = int(settings["rotation_count"])
-                if "fetch_interval" in settings:
-                    self.fetch_interval = int(settings["fetch_interval"])
-                if "rotation_interval" in settings:
-                    self.rotation_interval = int(settings["rotation_interval"])
-        return response
-
+                    return True
+
+        return False
+
+    def _on_register_error(self, ex) -> None:
+        logging.error("No Connection... try again")
+        logging.error(ex)
+
+    def _on_connection_error(self, ex) -> None:
+        # the poller retries with backoff, the next snapshot ends the wait
+        logging.error("No Connection... try again")
+        logging.error(ex)
+
+        self.screen.submit(self.display_renderer.draw_center_text, "No connection")
+
+    def _on_unauthenticated(self, ex) -> None:
+        logging.error("Unauthenticated")
+
+    def _on_invalid_response(self, ex) -> None:
+        logging.error("Invalid Response: " + str(ex))
+
+    def _on_invalid_token(self, ex) -> None:
+        logging.error("Invalid Token")
+
+    def _on_storage_error(self, ex) -> None:
+        # the message stays shown, both writes are repeated
+        logging.error("Storing the read message failed: %s", ex)
+
+    def _show_message(self, message: dict) -> None:
+        frame = self.store.frame(message["id"], self.display_renderer.frame_version())
+        if frame is not None:
+            self.screen.submit(self.display_renderer.draw_frame, frame)
+        else:
+            self.screen.submit(
+                self.display_renderer.draw_message_text,
+                message["text"],
+                message["author"]["name"],
+                message["text_color"],
+                message["background_color"],
+            )
+
+    def _show_stored_message(self) -> None:
+        """Shows the unread message from before the restart until the first response arrives"""
+        message = self.store.next_unread()
+        if message is not None:
+            logging.info("Showing stored message %s", message["id"])
+            self._show_message(message)
+
+    def _render_ahead(self, limit: int = 2) -> None:
+        """Renders unread messages on the display worker while it has nothing else to do"""
+        for message in self.store.unread_without_frame(self.display_renderer.frame_version(), limit):
+            self.screen.submit_background(self._prerender, message)
+
+    def _prerender(self, message: dict) -> None:
+        renderer = self.display_renderer
+        frame = renderer.render_frame(
+            renderer.render_message_text,
+            message["text"],
+            message["author"]["name"],
+            message["text_color"],
+            message["background_color"],
+        )
+        self.store.save_frame(message["id"], frame, renderer.frame_version())
+
+    def _on_receipts_sent(self, message_ids):
+        # fetch the state after the receipts right away
+        self.poller.poll_now()
+
+    def _on_snapshot(self, snapshot):
+        """Applies the settings of every changed snapshot (runs on the poller thread)"""
+        if snapshot.error is not None or not snapshot.modified:
+            return
+
+        # prefetch: every pending message is stored and rendered ahead
+        if self.store.sync(snapshot.response):
+            self.poller.note_activity()
+            self._render_ahead()
+
+        self._apply_settings(snapshot.settings)
+
+        # kept for the next start, only written when they changed
+        settings = dict(self._saved_settings)
+        settings.update((key, snapshot.settings[key]) for key in SETTINGS_KEYS if key in snapshot.settings)
+        if settings != self._saved_settings:
+            try:
+                self.config_handler.save_settings(settings)
+                self._saved_settings = settings
+            except OSError as ex:
+                logging.error("Saving the settings failed: %s", ex)
+
+    def _apply_settings(self, settings: dict) -> None:
+        if "mute" in settings:
+            self.muted = bool(settings["mute"])
+            if self.muted:
+                self.motion.cancel()
+        if "rotation_count" in settings:
+            self.rotation_count = int(settings["rotation_count"])
+        if "fetch_interval" in settings:
+            self.fetch_interval = int(settings["fetch_interval"])
+            self.poller.interval = self.fetch_interval
+        if "rotation_interval" in settings:
+            self.rotation_interval = int(settings["rotation_interval"])
@@ -0,0 +1,255 @@
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from const import DATA_DIRECTORY, METRICS_FILE_INTERVAL, METRICS_FILE_NAME, METRICS_PORT
+
+# seconds, wide enough for SPI writes as well as hours spent waiting in a state
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 3600)
+
+HELP = {
+    "messagebox_state_seconds": "Time spent in a state of the state machine",
+    "messagebox_state_errors_total": "Errors a state ended with",
+    "messagebox_http_request_seconds": "Latency of backend requests",
+    "messagebox_http_failures_total": "Backend requests which failed without a response",
+    "messagebox_render_seconds": "Time to render a screen which was not cached",
+    "messagebox_frame_write_seconds": "Time to send a frame to the display",
+    "messagebox_servo_motion_seconds": "Duration of servo motions",
+    "messagebox_servo_steps_total": "Servo steps played",
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram, one counter per bucket plus sum and count"""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Timer:
+    __slots__ = ("registry", "key", "start")
+
+    def __init__(self, registry, key: tuple):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """In-memory latency histograms, counters and gauges in Prometheus text format.
+
+    Disabled by default, then every call returns right away."""
+
+    def __init__(self):
+        self.enabled = False
+
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._null_timer = contextlib.nullcontext()
+
+        self._exporter = None
+        self._exporter_mode = None
+
+    def timer(self, name: str, **labels):
+        """Context manager which observes the time spent in its block"""
+        if not self.enabled:
+            return self._null_timer
+        return _Timer(self, _key(name, labels))
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if self.enabled:
+            self._observe(_key(name, labels), value)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _observe(self, key: tuple, value: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name: str, help_text: str, read) -> None:
+        """read() is called for every export and returns the current value"""
+        self._gauges[name] = (help_text, read)
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()]
+            counters = list(self._counters.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, kind, help_text=None):
+            if name not in described:
+                described.add(name)
+                lines.append("# HELP %s %s" % (name, help_text or HELP.get(name, name)))
+                lines.append("# TYPE %s %s" % (name, kind))
+
+        for (name, labels), counts, total, count in sorted(histograms):
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append("%s_bucket%s %d" % (name, _labels(labels + (("le", bound),)), cumulative))
+            lines.append("%s_sum%s %f" % (name, _labels(labels), total))
+            lines.append("%s_count%s %d" % (name, _labels(labels), count))
+
+        for (name, labels), value in sorted(counters):
+            describe(name, "counter")
+            lines.append("%s%s %s" % (name, _labels(labels), value))
+
+        for name, (help_text, read) in sorted(self._gauges.items()):
+            try:
+                value = float(read())
+            except Exception as ex:
+                logging.error("Reading gauge %s failed: %s", name, ex)
+                continue
+            describe(name, "gauge", help_text)
+            lines.append("%s %s" % (name, value))
+
+        return "\n".join(lines) + "\n"
+
+    def start_exporter(self, mode: str) -> None:
+        """Enables the metrics and exports them: "file", "http" or "" for off.
+
+        Called again with another mode, e.g. after config.ini was edited, it
+        replaces the running exporter."""
+        try:
+            mode = exporter_mode(mode)
+        except ValueError as ex:
+            logging.error(str(ex))
+            return
+
+        if mode is None:
+            self.enabled = False
+            self._replace_exporter(None, None)
+            return
+
+        if self._exporter is not None and mode == self._exporter_mode:
+            self.enabled = True
+            return
+
+        if mode == "http":
+            exporter = MetricsServer(self, METRICS_PORT)
+        else:
+            path = os.path.join(os.path.dirname(os.path.realpath(__file__)), DATA_DIRECTORY, METRICS_FILE_NAME)
+            exporter = MetricsFile(self, path, METRICS_FILE_INTERVAL)
+        self.enabled = True
+        self._replace_exporter(exporter, mode)
+        exporter.start()
+
+    def _replace_exporter(self, exporter, mode: str) -> None:
+        if self._exporter is not None:
+            self._exporter.stop()
+        self._exporter = exporter
+        self._exporter_mode = mode
+
+
+class MetricsFile:
+    """Rewrites a .prom file periodically, e.g. for node_exporter's textfile collector"""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        threading.Thread(target=self._run, name="metrics-file", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            temp_path = self.path + ".tmp"
+            try:
+                with open(temp_path, "w") as file:
+                    file.write(self.registry.render())
+                os.replace(temp_path, self.path)
+            except OSError as ex:
+                logging.error("Writing metrics failed: %s", ex)
+
+
+class MetricsServer:
+    """Serves the metrics on http://127.0.0.1:<port>/metrics"""
+
+    def __init__(self, registry: MetricsRegistry, port: int):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def exporter_mode(mode: str) -> str:
+    """The exporter of a Metrics setting, "file", "http" or None if off, ValueError if unknown"""
+    mode = (mode or "").strip().lower()
+    if mode in ("", "off", "false", "no"):
+        return None
+    if mode not in ("file", "http"):
+        raise ValueError("Unknown metrics exporter: " + mode)
+    return mode
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())) if labels else ())
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace('"', '\\"')) for name, value in labels)
+
+
+# process-wide registry
+metrics = MetricsRegistry()
@@ -1,4 +1,18 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from Metrics import metrics
+
+LINE_END = re.compile(rb"\r\n|\r|\n")
 
 
 class UnauthenticatedError(Exception):
@@ -13,47 +27,229 @@ class InvalidResponseError(Exception):
     pass
 
 
+class StreamingUnsupportedError(Exception):
+    pass
+
+
+class RequestStats:
+    """Latency and connection reuse statistics of the HTTP session"""
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.modified = 0  # 200 responses of the messages endpoint
+        self.not_modified = 0  # 304 responses of the messages endpoint
+        self.bytes_received = 0  # body bytes as transferred, before decompression
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, latency: float, failed: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.failures += failed
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.last_latency[name] = latency
+
+    def record_response(self, response: requests.Response) -> None:
+        with self._lock:
+            self.bytes_received += response.raw.tell()
+            if response.status_code == 304:
+                self.not_modified += 1
+            elif response.status_code == 200:
+                self.modified += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            polls = self.modified + self.not_modified
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "bytes_received": self.bytes_received,
+                "not_modified": self.not_modified,
+                "not_modified_ratio": self.not_modified / polls if polls else 0.0,
+                "mean_latency": self.total_latency / self.requests if self.requests else 0.0,
+                "max_latency": self.max_latency,
+                "last_latency": dict(self.last_latency),
+            }
+
+
 class NetworkManager:
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 15
+    POOL_SIZE = 3  # poller, read receipts and message stream
+
+    # the server sends keep-alive comments, a silent stream is considered dead
+    STREAM_READ_TIMEOUT = 90
+    STREAM_BACKOFF_BASE = 1
+    STREAM_BACKOFF_MAX = 120
+    STREAM_READ_SIZE = 4096  # most bytes taken from the stream at once
+
     def __init__(self, endpoint):
         self.endpoint = endpoint
         self.token = ""
+        # endpoint and token change together, see configure
+        self._credentials_lock = threading.Lock()
+
+        self.stats = RequestStats()
+
+        # validators and body of the last messages response, for conditional requests
+        self.etag = None
+        self.last_modified = None
+        self.last_response = None
+        self.not_modified = False
+        self._cache_lock = threading.Lock()
+
+        # True while the server push stream is connected
+        self.streaming = False
+        # whether PATCH /api/messages accepts a list of ids, None until known
+        self.batch_read = None
+
+        # backoff of 0.5s, 1s, 2s: bounded by the number of attempts. A Retry-After
+        # of the server is not slept here, it would block the thread for as long
+        # as the server asks; the PollScheduler backs off after the failed poll
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=2,
+            status=3,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "PATCH"]),
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_SIZE, max_retries=retry)
+
+        # keep-alive session shared by all threads, requests are independent of each other
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def _request(self, name: str, method: str, path: str, authorized: bool = False, **kwargs) -> requests.Response:
+        """Sends a request to the endpoint, with the matching token if authorized"""
+        endpoint, token = self.credentials()
+        if authorized:
+            kwargs["headers"] = {**self._auth_header(token), **kwargs.get("headers", {})}
+        start = time.monotonic()
+        try:
+            response = self.session.request(
+                method,
+                endpoint + path,
+                timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT),
+                **kwargs
+            )
+        except requests.RequestException:
+            self.stats.record(name, time.monotonic() - start, failed=True)
+            metrics.inc("messagebox_http_failures_total", request=name)
+            raise
+        latency = time.monotonic() - start
+        self.stats.record(name, latency)
+        metrics.observe("messagebox_http_request_seconds", latency, request=name)
+        response.content  # read the body, so the transferred bytes are known
+        self.stats.record_response(response)
+        return response
+
+    def connection_stats(self) -> dict:
+        """Request statistics including how many requests reused a pooled connection"""
+        stats = self.stats.as_dict()
+
+        connections = 0
+        pooled_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+
+        stats["connections"] = connections
+        stats["reused"] = max(pooled_requests - connections, 0)
+        return stats
 
     def register_device(self, hardware_id: str) -> str:
         payload = {"device": hardware_id}
         headers = {"Content-type": "application/json", "Accept": "application/json"}
-        request = requests.get(
-            self.endpoint + "/api/register", params=payload, headers=headers
-        )
+        request = self._request("register", "GET", "/api/register", params=payload, headers=headers)
 
         status = request.status_code
 
         if status == 200:
-            if request.json()["token"]:
-                self.token = request.json()["token"]
-                return self.token
+            token = request.json().get("token")
+            if token:
+                with self._credentials_lock:
+                    self.token = token
+                return token
 
         return None
 
-    def _auth_header(self) -> dict:
+    def _auth_header(self, token: str) -> dict:
         return {
-            "Authorization": "Bearer " + self.token,
+            "Authorization": "Bearer " + token,
             "Content-type": "application/json",
             "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
         }
 
+    def configure(self, endpoint: str, token: str) -> None:
+        """Switches to another endpoint or token, e.g. after config.ini was edited.
+
+        Fetches use them right away, the stream reconnects at its next event or keep-alive.
+        Safe to call from another thread, requests never mix the old and the new pair."""
+        with self._credentials_lock:
+            self.endpoint = endpoint
+            self.token = token
+        self.invalidate_messages()
+
+    def credentials(self) -> tuple:
+        """(endpoint, token) as one consistent pair"""
+        with self._credentials_lock:
+            return self.endpoint, self.token
+
+    def invalidate_messages(self) -> None:
+        """Forces the next fetch to download the full messages document"""
+        with self._cache_lock:
+            self.etag = None
+            self.last_modified = None
+            self.last_response = None
+
     def fetch_messages(self) -> dict:
+        """Fetches messages and settings.
+
+        Sends the validators of the last response, on 304 Not Modified the
+        last parsed response is returned again and not_modified is set."""
         if self.token:
-            request = requests.get(
-                self.endpoint + "/api/messages", headers=self._auth_header()
-            )
+            headers = {}
+            with self._cache_lock:
+                if self.last_response is not None:
+                    if self.etag:
+                        headers["If-None-Match"] = self.etag
+                    if self.last_modified:
+                        headers["If-Modified-Since"] = self.last_modified
+
+            request = self._request("messages", "GET", "/api/messages", authorized=True, headers=headers)
+
+            if request.status_code == 304:
+                with self._cache_lock:
+                    if self.last_response is not None:
+                        self.not_modified = True
+                        return self.last_response
+                raise InvalidResponseError("InvalidResponseError: 304 without a cached response")
 
             if request.status_code == 200:
                 response = request.json()
 
-                if "message" in response and "settings" in response:
+                if isinstance(response, dict) and "message" in response and "settings" in response:
+                    with self._cache_lock:
+                        self.etag = request.headers.get("ETag")
+                        self.last_modified = request.headers.get("Last-Modified")
+                        self.last_response = response
+                        self.not_modified = False
                     return response
 
-                raise InvalidResponseError("InvalidResponseError: " + response)
+                raise InvalidResponseError("InvalidResponseError: " + str(response))
 
             elif request.status_code == 401:
                 raise UnauthenticatedError()
@@ -61,11 +257,185 @@ class NetworkManager:
         raise InvalidTokenError()
 
     def read_message(self, message_id: int) -> bool:
+        """Marks a message as read, returns True once the server acknowledged it"""
         if self.token and message_id:
-            requests.patch(
-                self.endpoint + f"/api/messages/{message_id}",
-                headers=self._auth_header(),
-            )
-            return True
+            request = self._request("read", "PATCH", f"/api/messages/{message_id}", authorized=True)
+            if request.status_code == 401:
+                raise UnauthenticatedError()
+
+            # the cached response still contains the message which was just read
+            self.invalidate_messages()
+            # an unknown message does not need a receipt anymore
+            return request.status_code < 300 or request.status_code == 404
 
         raise InvalidTokenError()
+
+    def read_messages(self, message_ids: list) -> list:
+        """Marks several messages as read, returns the acknowledged ids.
+
+        Uses a single batch request if the backend supports it. A failed batch
+        request acknowledges nothing, the ids stay in the outbox for a retry."""
+        if not self.token:
+            raise InvalidTokenError()
+
+        if self.batch_read is not False and len(message_ids) > 1:
+            request = self._request(
+                "read_batch", "PATCH", "/api/messages", authorized=True, json={"ids": message_ids}
+            )
+            if request.status_code == 401:
+                raise UnauthenticatedError()
+            if request.status_code < 300:
+                self.batch_read = True
+                self.invalidate_messages()
+                return list(message_ids)
+            if request.status_code not in (404, 405, 501):
+                # e.g. 429 or 503, one request per id would only add to the load
+                logging.warning("Batch read receipts failed: %d", request.status_code)
+                return []
+            logging.info("Batch read receipts not supported")
+            self.batch_read = False
+
+        return [message_id for message_id in message_ids if self.read_message(message_id)]
+
+    def listen_messages(self, on_response, stop_event: threading.Event) -> None:
+        """Holds a Server-Sent Events stream open and forwards pushed documents.
+
+        on_response is called with a messages document ({"message", "settings"})
+        or with None if only a refetch is needed. Lost connections are retried
+        with jittered exponential backoff until stop_event is set.
+        Raises StreamingUnsupportedError if the backend has no stream endpoint."""
+        attempt = 0
+        while not stop_event.is_set():
+            try:
+                self._listen(on_response, stop_event)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as ex:
+                logging.info("Message stream lost: %s", ex)
+            finally:
+                # start over with a short delay if the stream was connected
+                if self.streaming:
+                    attempt = 0
+                self.streaming = False
+
+            delay = min(self.STREAM_BACKOFF_MAX, self.STREAM_BACKOFF_BASE * 2 ** attempt)
+            delay *= random.uniform(0.5, 1.0)
+            attempt += 1
+            logging.info("Reconnecting message stream in %.1fs", delay)
+            stop_event.wait(delay)
+
+    def _listen(self, on_response, stop_event: threading.Event) -> None:
+        credentials = endpoint, token = self.credentials()
+        headers = self._auth_header(token)
+        headers["Accept"] = "text/event-stream"
+        headers["Accept-Encoding"] = "identity"
+
+        with self.session.get(
+            endpoint + "/api/messages/stream",
+            headers=headers,
+            stream=True,
+            timeout=(self.CONNECT_TIMEOUT, self.STREAM_READ_TIMEOUT),
+        ) as response:
+            if response.status_code == 401:
+                raise UnauthenticatedError()
+            content_type = response.headers.get("Content-Type", "")
+            if response.status_code in (404, 405, 406, 501) or (
+                response.status_code == 200 and not content_type.startswith("text/event-stream")
+            ):
+                raise StreamingUnsupportedError()
+            if response.status_code != 200:
+                raise requests.ConnectionError("Stream status " + str(response.status_code))
+
+            self.streaming = True
+            logging.info("Message stream connected")
+
+            for event, data in self._read_events(response):
+                if stop_event.is_set():
+                    return
+                if self.credentials() != credentials:
+                    logging.info("Message stream credentials changed, reconnecting")
+                    return
+                if event is not None:
+                    self._dispatch_event(event, data, on_response)
+
+    def _read_events(self, response):
+        """Parses the text/event-stream format into (event, data) tuples, (None, None) for keep-alives"""
+        event, data = "message", []
+        for line in self._read_lines(response):
+            if not line:
+                if data:
+                    yield event, "\n".join(data)
+                event, data = "message", []
+            elif line.startswith(":"):
+                yield None, None  # keep-alive comment
+            else:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+
+    def _read_lines(self, response):
+        """Lines of the stream, ended by CRLF, LF or CR as the event stream format allows"""
+        buffer = bytearray()
+        searched = 0  # the start of the buffer holds no line end, each byte is only scanned once
+        for chunk in self._read_chunks(response):
+            buffer += chunk
+            while True:
+                match = LINE_END.search(buffer, searched)
+                if match is None:
+                    searched = len(buffer)
+                    break
+                if match.group() == b"\r" and match.end() == len(buffer):
+                    # the LF of a CRLF may still be on its way
+                    searched = match.start()
+                    break
+                yield buffer[: match.start()].decode("utf8", errors="replace")
+                del buffer[: match.end()]
+                searched = 0
+
+    def _read_chunks(self, response):
+        """Whatever arrived of the stream, without waiting for more data than an event has"""
+        read1 = getattr(response.raw, "read1", None)
+        if read1 is None:
+            # urllib3 before 2.0 fills every read, single bytes do not wait for the next event
+            yield from response.iter_content(chunk_size=1)
+            return
+
+        # the same errors iter_content raises
+        try:
+            while True:
+                chunk = read1(self.STREAM_READ_SIZE, decode_content=True)
+                if not chunk:
+                    return
+                yield chunk
+        except urllib3.exceptions.ProtocolError as ex:
+            raise requests.exceptions.ChunkedEncodingError(ex)
+        except urllib3.exceptions.DecodeError as ex:
+            raise requests.exceptions.ContentDecodingError(ex)
+        except urllib3.exceptions.ReadTimeoutError as ex:
+            raise requests.ConnectionError(ex)
+        except urllib3.exceptions.SSLError as ex:
+            raise requests.exceptions.SSLError(ex)
+
+    def _dispatch_event(self, event: str, data: str, on_response) -> None:
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            logging.error("Invalid stream event: " + data)
+            return
+        if not isinstance(payload, dict):
+            logging.error("Invalid stream event: " + data)
+            return
+
+        if event == "messages" and "message" in payload and "settings" in payload:
+            on_response(payload)
+        elif event == "settings" and "settings" in payload:
+            with self._cache_lock:
+                last_response = self.last_response
+            if last_response is not None:
+                on_response({"message": last_response["message"], "settings": payload["settings"]})
+            else:
+                on_response(None)
+        else:
+            # unknown or partial events (e.g. a single message) trigger a regular fetch
+            on_response(None)
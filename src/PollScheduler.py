@@ -0,0 +1,100 @@
+import hashlib
+import random
+import time
+
+from const import (ACTIVITY_POLL_DURATION, ACTIVITY_POLL_INTERVAL, ERROR_BACKOFF_MAX, ERROR_RETRY_INTERVAL,
+                   POLL_JITTER, PUSH_POLL_INTERVAL, QUIET_HOURS_FACTOR, STARTUP_JITTER)
+
+
+class PollScheduler:
+    """Decides how long the poller waits before the next request.
+
+    The server-provided fetch interval is the baseline. Every delay gets a
+    per-device jitter, so boxes which were started (or lost the backend) at
+    the same moment drift apart instead of polling in lockstep."""
+
+    def __init__(self, interval: int = 60, quiet_hours: str = "", seed=None, clock=time.time):
+        self.interval = interval
+        self.clock = clock
+        self.errors = 0  # consecutive failed polls
+        self.activity_until = 0.0
+
+        self.quiet_hours = None
+        self.set_quiet_hours(quiet_hours)
+
+        self.random = random.Random()
+        self.seed(seed)
+
+    def seed(self, device_id) -> None:
+        """Derives the jitter from the hardware id, so every box gets its own sequence"""
+        if device_id is None:
+            self.random.seed()
+        else:
+            self.random.seed(hashlib.sha1(str(device_id).encode("utf8")).hexdigest())
+
+    def set_quiet_hours(self, spec: str) -> None:
+        """Quiet hours as "HH:MM-HH:MM" in local time (e.g. "22:00-07:00"), empty to disable"""
+        self.quiet_hours = parse_quiet_hours(spec)
+
+    def note_activity(self) -> None:
+        """A message arrived or was read: poll more often for a while"""
+        self.activity_until = self.clock() + ACTIVITY_POLL_DURATION
+
+    def first_delay(self) -> float:
+        """Delay of the first poll, spreads boxes which were powered on together"""
+        return self.random.uniform(0, STARTUP_JITTER)
+
+    def next_delay(self, error: bool = False, streaming: bool = False) -> tuple:
+        """Returns (seconds until the next poll, reason)"""
+        if error:
+            self.errors += 1
+            # exponential backoff, randomized over the upper half of the step
+            delay = min(ERROR_BACKOFF_MAX, ERROR_RETRY_INTERVAL * 2 ** (self.errors - 1))
+            return delay * self.random.uniform(0.5, 1.0), "error #%d, backing off" % self.errors
+
+        self.errors = 0
+
+        if streaming:
+            # pushes arrive immediately, polling is only a safety net
+            return self._jitter(max(self.interval, PUSH_POLL_INTERVAL)), "push stream connected"
+
+        now = self.clock()
+        if now < self.activity_until:
+            return self._jitter(min(self.interval, ACTIVITY_POLL_INTERVAL)), "recent activity"
+
+        if self.in_quiet_hours(now):
+            return self._jitter(self.interval * QUIET_HOURS_FACTOR), "quiet hours"
+
+        return self._jitter(self.interval), "fetch interval"
+
+    def in_quiet_hours(self, now: float = None) -> bool:
+        if self.quiet_hours is None:
+            return False
+
+        local = time.localtime(self.clock() if now is None else now)
+        minute = local.tm_hour * 60 + local.tm_min
+        start, end = self.quiet_hours
+        if start <= end:
+            return start <= minute < end
+        return minute >= start or minute < end  # over midnight
+
+    def _jitter(self, delay: float) -> float:
+        return delay * self.random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+
+def parse_quiet_hours(spec: str) -> tuple:
+    """Quiet hours "HH:MM-HH:MM" as (start, end) minute of the day, None if empty, else ValueError"""
+    if not spec:
+        return None
+
+    def minute_of_day(clock_time: str) -> int:
+        hours, minutes = clock_time.strip().split(":")
+        if not (0 <= int(hours) < 24 and 0 <= int(minutes) < 60):
+            raise ValueError(clock_time)
+        return int(hours) * 60 + int(minutes)
+
+    try:
+        start, end = spec.split("-")
+        return minute_of_day(start), minute_of_day(end)
+    except ValueError:
+        raise ValueError("Invalid quiet hours: " + spec) from None
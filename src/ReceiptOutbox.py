@@ -0,0 +1,133 @@
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+
+from const import DATA_DIRECTORY, DATABASE_NAME
+from NetworkManager import InvalidTokenError, UnauthenticatedError
+
+
+class ReceiptOutbox:
+    """Persistent queue of read receipts which are sent to the backend in the background.
+
+    Receipts are written to SQLite before anything else happens, so they
+    survive outages and reboots. A flusher thread sends them in batches and
+    retries with exponential backoff until the server acknowledged them."""
+
+    BATCH_SIZE = 20
+    BACKOFF_BASE = 2
+    BACKOFF_MAX = 300
+
+    def __init__(self, network, path: str = None, on_flushed=None):
+        self.network = network
+        self.on_flushed = on_flushed
+
+        if path is None:
+            dir_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), DATA_DIRECTORY)
+            if not os.path.exists(dir_path):
+                os.mkdir(dir_path)
+            path = os.path.join(dir_path, DATABASE_NAME)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS receipts ("
+                " message_id INTEGER PRIMARY KEY,"
+                " created_at REAL NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt REAL NOT NULL)"
+            )
+            rows = self.connection.execute("SELECT message_id FROM receipts").fetchall()
+
+        # mirror of the table, so the pending gauge does not need a query
+        self._pending = {row[0] for row in rows}
+
+    def add(self, message_id: int) -> None:
+        """Stores a receipt and returns without waiting for the network"""
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO receipts (message_id, created_at, next_attempt) VALUES (?, ?, ?)",
+                (message_id, now, now),
+            )
+            self._pending.add(message_id)
+        self._wakeup.set()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="receipt-outbox", daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self._flush()
+                timeout = self._seconds_until_next_attempt()
+                failures = 0
+            except Exception:
+                # e.g. "database is locked", the receipts stay stored for the next attempt
+                failures += 1
+                logging.exception("Read receipt outbox failed")
+                timeout = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** failures)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _seconds_until_next_attempt(self):
+        with self._lock:
+            row = self.connection.execute("SELECT MIN(next_attempt) FROM receipts").fetchone()
+        if row[0] is None:
+            return None  # nothing to send, sleep until the next receipt
+        return max(row[0] - time.time(), 0)
+
+    def _flush(self) -> None:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT message_id, attempts FROM receipts WHERE next_attempt <= ? ORDER BY created_at LIMIT ?",
+                (time.time(), self.BATCH_SIZE),
+            ).fetchall()
+        if not rows:
+            return
+
+        message_ids = [row[0] for row in rows]
+        try:
+            acknowledged = set(self.network.read_messages(message_ids))
+        except (requests.RequestException, InvalidTokenError, UnauthenticatedError) as ex:
+            logging.error("Sending read receipts failed: %s", ex)
+            acknowledged = set()
+
+        now = time.time()
+        with self._lock, self.connection:
+            for message_id, attempts in rows:
+                if message_id in acknowledged:
+                    self.connection.execute("DELETE FROM receipts WHERE message_id = ?", (message_id,))
+                    self._pending.discard(message_id)
+                else:
+                    delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempts) * random.uniform(0.5, 1.0)
+                    self.connection.execute(
+                        "UPDATE receipts SET attempts = ?, next_attempt = ? WHERE message_id = ?",
+                        (attempts + 1, now + delay, message_id),
+                    )
+
+        logging.info("Read receipts sent: %d of %d", len(acknowledged), len(rows))
+        if acknowledged and self.on_flushed is not None:
+            self.on_flushed(acknowledged)
@@ -0,0 +1,159 @@
+import json
+import logging
+import mmap
+import os
+import struct
+
+from const import CACHE_DIRECTORY, FONT_FAMILY, STATIC_SCREENS
+
+FILE_MAGIC = b"SCRB"
+FILE_VERSION = 1
+
+
+class ScreenBundle:
+    """Pre-rendered panel frames of the static screens, stored in one memory-mapped file"""
+
+    FILE_NAME = "screens.bundle"
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.dir_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), CACHE_DIRECTORY)
+
+        self.index = {}
+        self.screens = None  # set by load, a bundle which was only opened is not rebuilt
+        self._file = None
+        self._map = None
+
+    @property
+    def file_path(self) -> str:
+        return os.path.join(self.dir_path, self.FILE_NAME)
+
+    @staticmethod
+    def key(render_name: str, args, rotation: int) -> str:
+        return json.dumps([render_name, list(args), rotation])
+
+    def get(self, render_name: str, args) -> memoryview:
+        """Returns the frame of a static screen without copying it, or None"""
+        entry = self.index.get(self.key(render_name, args, self.renderer.display.rotation))
+        if entry is None or self._map is None:
+            return None
+        offset, length = entry
+        frame = memoryview(self._map)[offset : offset + length]
+        if len(frame) != self._frame_bytes():
+            # e.g. the file was cut short after it was mapped
+            logging.error("Discarding damaged screen bundle, %s is %d bytes", render_name, len(frame))
+            frame.release()
+            self._rebuild()
+            return None
+        return frame
+
+    def load(self, screens=STATIC_SCREENS) -> None:
+        """Maps the bundle, it is rebuilt if the font, display size or rotation changed"""
+        self.screens = screens
+        fingerprint = self._fingerprint(screens)
+        try:
+            self._open(fingerprint)
+        except (OSError, ValueError, struct.error) as ex:
+            logging.info("Building screen bundle (%s)", ex)
+            self.close()
+            self.build(screens, fingerprint)
+            self._open(fingerprint)
+
+    def build(self, screens=STATIC_SCREENS, fingerprint: dict = None) -> None:
+        if fingerprint is None:
+            fingerprint = self._fingerprint(screens)
+
+        rotation = self.renderer.display.rotation
+        header = {"fingerprint": fingerprint, "screens": []}
+        frames = []
+        offset = 0
+        for render_name, args in screens:
+            render = getattr(self.renderer, render_name)
+            frame = self.renderer._to_panel(render(*args))
+            header["screens"].append([self.key(render_name, args, rotation), offset, len(frame)])
+            frames.append(frame)
+            offset += len(frame)
+
+        if not os.path.exists(self.dir_path):
+            os.mkdir(self.dir_path)
+
+        header_bytes = json.dumps(header).encode("utf8")
+        temp_path = self.file_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(FILE_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+            for frame in frames:
+                file.write(frame)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.file_path)
+
+    def close(self) -> None:
+        self.index = {}
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def open(self, screens=STATIC_SCREENS) -> None:
+        """Maps the bundle as it is, raises if it is missing or outdated"""
+        self._open(self._fingerprint(screens))
+
+    def _open(self, fingerprint: dict) -> None:
+        self._file = open(self.file_path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:4] != FILE_MAGIC:
+            raise ValueError("Invalid screen bundle")
+        (header_length,) = struct.unpack_from("<I", self._map, 4)
+        data_offset = 8 + header_length
+        header = json.loads(self._map[8:data_offset].decode("utf8"))
+
+        if header["fingerprint"] != fingerprint:
+            raise ValueError("Screen bundle is outdated")
+
+        index = {}
+        for key, offset, length in header["screens"]:
+            if length != self._frame_bytes() or data_offset + offset + length > len(self._map):
+                raise ValueError("Screen bundle is truncated")
+            index[key] = (data_offset + offset, length)
+        self.index = index
+
+    def _rebuild(self) -> None:
+        """Replaces a damaged bundle, views handed out before keep the old mapping alive"""
+        self.index = {}
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.screens is None:
+            return
+
+        fingerprint = self._fingerprint(self.screens)
+        try:
+            self.build(self.screens, fingerprint)
+            self._open(fingerprint)
+        except (OSError, ValueError, struct.error) as ex:
+            logging.error("Screen bundle not available: %s", ex)
+            self.close()
+
+    def _frame_bytes(self) -> int:
+        display = self.renderer.display
+        return display.width * display.height * 2
+
+    def _fingerprint(self, screens) -> dict:
+        display = self.renderer.display
+        stat = os.stat(FONT_FAMILY)
+        return {
+            "version": FILE_VERSION,
+            "font": FONT_FAMILY,
+            "font_mtime": int(stat.st_mtime),
+            "font_bytes": stat.st_size,
+            "width": display.width,
+            "height": display.height,
+            "rotation": display.rotation,
+            "backend": self.renderer.backend,
+            "swap_rb": self.renderer.swap_rb,
+            "screens": [[render_name, list(args)] for render_name, args in screens],
+        }
@@ -0,0 +1,118 @@
+import functools
+import logging
+import threading
+
+from const import SERVO_MOVE_TIME, SERVO_ROTATION_SPEED
+from Metrics import metrics
+from ServoMotor import ServoMotor
+
+
+@functools.lru_cache(maxsize=8)
+def build_profile(rotation_count: int, speed: float = SERVO_ROTATION_SPEED, move_time: float = SERVO_MOVE_TIME) -> tuple:
+    """Motion of one notification as (duty cycle, hold time) steps.
+
+    Starts from the home position and swings to 180 degrees and back
+    rotation_count times. A duty cycle of 0 idles the PWM between moves."""
+    home = ServoMotor.duty_cycle(0)
+    out = ServoMotor.duty_cycle(180)
+
+    steps = [(home, move_time), (0, speed)]
+    for _ in range(rotation_count):
+        steps += [(out, move_time), (0, speed), (home, move_time), (0, speed)]
+    return tuple(steps)
+
+
+class MotionEngine:
+    """Runs motion profiles on one long-lived worker thread.
+
+    A new profile preempts the running one and cancel() stops the motor
+    right away: every hold is a wait on a condition, which a cancellation
+    interrupts instead of a sleep which has to run out."""
+
+    def __init__(self, servo):
+        self.servo = servo
+
+        self.steps = 0
+        self.cancelled = 0
+
+        self._profile = None
+        self._repeat_every = None
+        self._generation = 0  # increased by every play() and cancel()
+        self._moving = False
+        self._running = True
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, name="servo-motion", daemon=True)
+        self._thread.start()
+
+    def play(self, profile: tuple, repeat_every: float = None) -> None:
+        """Starts a profile, repeated every repeat_every seconds until it is cancelled"""
+        with self._condition:
+            self._generation += 1
+            self._profile = profile
+            self._repeat_every = repeat_every
+            self._condition.notify_all()
+
+    def cancel(self, timeout: float = 1.0) -> bool:
+        """Stops the motion and returns once the PWM is idle"""
+        with self._condition:
+            self._generation += 1
+            self._profile = None
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._moving, timeout)
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: self._profile is None and not self._moving, timeout)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._generation += 1
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._profile is not None or not self._running)
+                if not self._running:
+                    return
+                profile, repeat_every, generation = self._profile, self._repeat_every, self._generation
+                self._moving = True
+
+            try:
+                with metrics.timer("messagebox_servo_motion_seconds"):
+                    completed = self._play(profile, generation)
+                if completed and repeat_every is not None:
+                    completed = self._hold(generation, repeat_every)
+            except Exception as ex:
+                logging.error("Servo motion failed: %s", ex)
+                completed = False
+            finally:
+                self.servo.set_duty_cycle(0)
+
+            with self._condition:
+                if not completed:
+                    self.cancelled += 1
+                if generation == self._generation and repeat_every is None:
+                    self._profile = None
+                self._moving = False
+                self._condition.notify_all()
+
+    def _play(self, profile: tuple, generation: int) -> bool:
+        for duty_cycle, hold in profile:
+            with self._condition:
+                if generation != self._generation:
+                    return False
+                self.steps += 1
+            metrics.inc("messagebox_servo_steps_total")
+            self.servo.set_duty_cycle(duty_cycle)
+            if not self._hold(generation, hold):
+                return False
+        return True
+
+    def _hold(self, generation: int, seconds: float) -> bool:
+        """Waits unless the motion is cancelled or preempted, False if it was"""
+        with self._condition:
+            return not self._condition.wait_for(lambda: generation != self._generation, seconds)
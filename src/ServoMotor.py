@@ -1,28 +1,40 @@
-import threading
 import time
 
-import RPi.GPIO as GPIO
+from const import SERVO_MOVE_TIME
 
 
 class ServoMotor:
-    def __init__(self, data_pin: int):
+    def __init__(self, data_pin: int, gpio=None):
+        if gpio is None:
+            # imported on first use, it is slow to load and only available on the Pi
+            import RPi.GPIO as gpio
+
         self.data_pin = data_pin
+        self.gpio = gpio
 
         # GPIO Setup
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.data_pin, GPIO.OUT)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(self.data_pin, self.gpio.OUT)
 
         self.pulse = 50  # 50Hz
 
-        self.servo = GPIO.PWM(self.data_pin, self.pulse)
+        self.servo = self.gpio.PWM(self.data_pin, self.pulse)
         self.servo.start(0)
 
+    @staticmethod
+    def duty_cycle(angle: float) -> float:
+        return 2 + (angle / 18)
+
+    def set_duty_cycle(self, duty_cycle: float) -> None:
+        """0 stops the pulses, the servo holds its position without power"""
+        self.servo.ChangeDutyCycle(duty_cycle)
+
     def rotate(self, angle: float):
         if 0 <= angle <= 180:
-            self.servo.ChangeDutyCycle(2 + (angle / 18))
-            time.sleep(0.25)
-            self.servo.ChangeDutyCycle(0)
+            self.set_duty_cycle(self.duty_cycle(angle))
+            time.sleep(SERVO_MOVE_TIME)
+            self.set_duty_cycle(0)
 
     def reset(self):
         self.servo.stop()
-        GPIO.cleanup()
+        self.gpio.cleanup()
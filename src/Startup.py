@@ -0,0 +1,123 @@
+import importlib
+import logging
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from boot_timing import seconds_since_boot, seconds_since_process_start
+from const import SPLASH_SCREEN, TEXT_BACKEND
+from ScreenBundle import ScreenBundle
+
+# loaded in parallel with the display setup, importing Messagebox waits for the ones it needs
+HEAVY_MODULES = ("PIL.Image", "requests", "gpiozero", "RPi.GPIO")
+
+
+class Startup:
+    """Brings the box up with the splash first.
+
+    The display is set up and shows the splash straight from the screen
+    bundle, which needs neither Pillow nor the renderer. Meanwhile the
+    heavy modules are imported on other threads. The Messagebox itself
+    reads the config and sets up the renderer in parallel as well."""
+
+    def __init__(self):
+        self.imports = {}  # module -> seconds, the imports overlap
+        self.first_frame = None  # seconds after process start
+        self.first_frame_after_boot = None
+        self.ready = None
+
+        self._lock = threading.Lock()
+        self._frame_event = threading.Event()
+
+    def run(self, create_display, trigger_pin: int, servo_pin: int):
+        """Returns the Messagebox once it is ready to run"""
+        with ThreadPoolExecutor(max_workers=len(HEAVY_MODULES) + 1, thread_name_prefix="startup") as pool:
+            display = pool.submit(self._show_splash, create_display)
+            for name in HEAVY_MODULES:
+                pool.submit(self._preload, name)
+            messagebox = self.load("Messagebox")
+            display, splash = display.result()
+
+        box = messagebox.Messagebox(display, trigger_pin, servo_pin, splash_frame=splash)
+        if splash is None:
+            # no bundle yet, the box draws the splash itself
+            box.screen.submit_background(self._frame_shown)
+        box.wait_config()
+        self.ready = seconds_since_process_start()
+
+        if self.first_frame is not None:
+            logging.info(
+                "First frame %.2fs after power-on, %.2fs after process start",
+                self.first_frame_after_boot,
+                self.first_frame,
+            )
+        logging.info("Ready %.2fs after process start", self.ready)
+        logging.debug("Import times: %s", self.imports)
+        return box
+
+    def load(self, name: str):
+        """Imports a module and records how long it took"""
+        started = time.perf_counter()
+        try:
+            return importlib.import_module(name)
+        finally:
+            with self._lock:
+                self.imports[name] = time.perf_counter() - started
+
+    def wait_first_frame(self, timeout: float = None) -> bool:
+        return self._frame_event.wait(timeout)
+
+    def report(self) -> str:
+        lines = ["Imports (in parallel):"]
+        for name, seconds in sorted(self.imports.items(), key=lambda item: -item[1]):
+            lines.append("  %-12s %6.3fs" % (name, seconds))
+        if self.first_frame is not None:
+            lines.append(
+                "First frame  %6.3fs after process start (%.2fs after power-on)"
+                % (self.first_frame, self.first_frame_after_boot)
+            )
+        lines.append("Ready        %6.3fs after process start" % self.ready)
+        return "\n".join(lines)
+
+    def _preload(self, name: str) -> None:
+        try:
+            self.load(name)
+        except ImportError:
+            # the component which needs it fails with the details
+            pass
+
+    def _show_splash(self, create_display):
+        started = time.perf_counter()
+        display = create_display()
+        with self._lock:
+            self.imports["display"] = time.perf_counter() - started
+
+        splash = self._bundled_splash(display)
+        if splash is not None:
+            display._block(0, 0, display.width - 1, display.height - 1, splash)
+            self._frame_shown()
+        return display, splash
+
+    def _bundled_splash(self, display) -> bytes:
+        """The splash frame from the screen bundle, None if there is no valid bundle yet"""
+        # the renderer is not there yet, the bundle only needs its settings
+        bundle = ScreenBundle(SimpleNamespace(display=display, backend=TEXT_BACKEND, swap_rb=True))
+        try:
+            bundle.open()
+            frame = bundle.get(*SPLASH_SCREEN)
+            if frame is None:
+                return None
+            with frame:  # the map can only be closed once the view is released
+                return bytes(frame)
+        except (OSError, ValueError, struct.error):
+            return None
+        finally:
+            bundle.close()
+
+    def _frame_shown(self) -> None:
+        if self.first_frame is None:
+            self.first_frame = seconds_since_process_start()
+            self.first_frame_after_boot = seconds_since_boot()
+            self._frame_event.set()
@@ -0,0 +1,18 @@
+"""Timing helpers to measure how fast the box comes up after power-on"""
+
+import os
+
+
+def seconds_since_boot() -> float:
+    """Time since the kernel started, i.e. since power-on"""
+    with open("/proc/uptime") as file:
+        return float(file.read().split()[0])
+
+
+def seconds_since_process_start() -> float:
+    """Time since this Python process was started"""
+    with open("/proc/self/stat") as file:
+        # the command name may contain spaces, the fields after it are fixed
+        fields = file.read().rsplit(")", 1)[1].split()
+    start_ticks = int(fields[19])
+    return seconds_since_boot() - start_ticks / os.sysconf("SC_CLK_TCK")
@@ -2,5 +2,63 @@
 
 HARDWARE_ID_LENGTH = 9
 FONT_FAMILY = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+FONT_METRICS_SIZES = range(10, 19)
+CACHE_DIRECTORY = "cache"
+DATA_DIRECTORY = "data"
+DATABASE_NAME = "messagebox.db"
+# last settings sent by the server, applied before the first fetch after a restart
+SETTINGS_NAME = "settings.json"
+# seconds between checks whether config.ini was edited
+CONFIG_WATCH_INTERVAL = 10
+TEXT_BACKEND = "atlas"
 MESSAGE_CHAR_LENGTH = 140
-SERVO_ROTATION_SPEED = 0.25
\ No newline at end of file
+MESSAGE_MIN_FONT_SIZE = 12
+MESSAGE_MAX_FONT_SIZE = 18
+SERVO_ROTATION_SPEED = 0.25
+# seconds the servo needs to reach a position
+SERVO_MOVE_TIME = 0.25
+# seconds in which further edges of the lid contact are ignored
+LID_BOUNCE_TIME = 0.05
+# seconds after which a lid wait reads the contact again, in case an edge got lost
+LID_RECHECK_INTERVAL = 0.5
+# seconds the fetch state waits for a snapshot before it checks the poller and the screen again
+SNAPSHOT_WAIT_TIMEOUT = 60
+# seconds between safety polls while the server push stream is connected
+PUSH_POLL_INTERVAL = 600
+# seconds until the next poll after a failed one, doubled for every further failure
+ERROR_RETRY_INTERVAL = 5
+ERROR_BACKOFF_MAX = 300
+# every poll delay is randomized by +/- this fraction
+POLL_JITTER = 0.1
+# the first poll after start is delayed by up to this many seconds
+STARTUP_JITTER = 5
+# after a message arrived or was read, poll this often for a while (seconds)
+ACTIVITY_POLL_INTERVAL = 10
+ACTIVITY_POLL_DURATION = 120
+# the fetch interval is multiplied by this during the configured quiet hours
+QUIET_HOURS_FACTOR = 5
+# metrics exporters (enabled with "metrics = file" or "metrics = http" in config.ini)
+METRICS_PORT = 9108
+METRICS_FILE_NAME = "messagebox.prom"
+METRICS_FILE_INTERVAL = 15
+# log level unless "loglevel" is set in config.ini
+LOG_LEVEL = "INFO"
+# records waiting for the log writer thread, further ones are dropped
+LOG_QUEUE_SIZE = 10000
+# at most this many INFO/DEBUG records of the same message per interval (seconds)
+LOG_SAMPLE_BURST = 5
+LOG_SAMPLE_INTERVAL = 60
+# the log file is written once this many records are buffered or the oldest is this old (seconds)
+LOG_FLUSH_RECORDS = 100
+LOG_FLUSH_INTERVAL = 30
+# main.py --startup-profile --startup-budget fails above this many seconds from process start to the splash
+STARTUP_BUDGET = 2.0
+# screens which are pre-rendered into the screen bundle: (render method, arguments)
+SPLASH_SCREEN = ("render_multi_line_center_text", ("MESSAGEBOX", 18, "white"))
+STATIC_SCREENS = (
+    SPLASH_SCREEN,
+    ("render_multi_line_center_text", ("NO MESSAGES", 18, "white")),
+    ("render_multi_line_center_text", ("DEVICE MUTED", 18, "white")),
+    ("render_multi_line_center_text", ("DEVICE REGISTERED", 18, "white")),
+    ("render_center_text", ("No connection", 16, "white")),
+)
@@ -0,0 +1,120 @@
+"""Conversion of Pillow frames into the 16-bit format of the display panel"""
+
+from PIL import Image, ImageChops
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is optional
+    numpy = None
+
+# Pillow's rotate(angle, expand=True) for the rotations the display supports
+ROTATIONS = {90: Image.ROTATE_90, 180: Image.ROTATE_180, 270: Image.ROTATE_270}
+
+# lookup tables for the Pillow fallback, the bits of both halves never overlap
+_HIGH_RED = [value & 0xF8 for value in range(256)]
+_HIGH_GREEN = [value >> 5 for value in range(256)]
+_LOW_GREEN = [(value << 3) & 0xE0 for value in range(256)]
+_LOW_BLUE = [value >> 3 for value in range(256)]
+
+
+def to_panel_orientation(image, rotation: int):
+    """Rotates a frame the same way the display driver does before it is sent"""
+    if rotation % 360 == 0:
+        return image
+    return image.transpose(ROTATIONS[rotation % 360])
+
+
+def to_rgb565(image, swap_rb: bool = False) -> bytes:
+    """Converts a frame into a big-endian RGB565 byte buffer.
+
+    With swap_rb the red and blue channel are exchanged for BGR panels,
+    so callers can keep using normal RGB colors."""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    if numpy is not None:
+        return _to_rgb565_numpy(image, swap_rb)
+    return _to_rgb565_pillow(image, swap_rb)
+
+
+def _to_rgb565_numpy(image, swap_rb: bool) -> bytes:
+    pixels = numpy.asarray(image)
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    if swap_rb:
+        red, blue = blue, red
+
+    color = (red & 0xF8).astype(numpy.uint16) << 8
+    color |= (green & 0xFC).astype(numpy.uint16) << 3
+    color |= blue >> 3
+    return color.astype(">u2", copy=False).tobytes()
+
+
+def _to_rgb565_pillow(image, swap_rb: bool) -> bytes:
+    red, green, blue = image.split()
+    if swap_rb:
+        red, blue = blue, red
+
+    # the bits of both halves never overlap, so adding them equals a bitwise or
+    high = ImageChops.add(red.point(_HIGH_RED), green.point(_HIGH_GREEN))
+    low = ImageChops.add(green.point(_LOW_GREEN), blue.point(_LOW_BLUE))
+
+    # let Pillow interleave the high and low byte of every pixel
+    return Image.merge("LA", (high, low)).tobytes()
+
+
+def changed_rects(old: bytes, new: bytes, width: int, height: int, band_height: int = 8) -> list:
+    """Compares two RGB565 frames in bands of rows.
+
+    Returns the inclusive (x0, y0, x1, y1) rectangles covering the changed
+    pixels, adjacent changed bands are merged into one rectangle."""
+    stride = width * 2
+    rects = []
+    last_band_y = None
+
+    for band_y in range(0, height, band_height):
+        rows = min(band_height, height - band_y)
+        start, end = band_y * stride, (band_y + rows) * stride
+        if old[start:end] == new[start:end]:
+            continue
+
+        if numpy is not None:
+            changed = numpy.frombuffer(old, ">u2", rows * width, start).reshape(rows, width) != numpy.frombuffer(
+                new, ">u2", rows * width, start
+            ).reshape(rows, width)
+            changed_rows = numpy.flatnonzero(changed.any(axis=1))
+            changed_columns = numpy.flatnonzero(changed.any(axis=0))
+            y0, y1 = band_y + int(changed_rows[0]), band_y + int(changed_rows[-1])
+            x0, x1 = int(changed_columns[0]), int(changed_columns[-1])
+        else:
+            y0 = y1 = x0 = x1 = None
+            for y in range(band_y, band_y + rows):
+                row_start = y * stride
+                old_row, new_row = old[row_start : row_start + stride], new[row_start : row_start + stride]
+                if old_row == new_row:
+                    continue
+                first = next(x for x in range(width) if old_row[x * 2 : x * 2 + 2] != new_row[x * 2 : x * 2 + 2])
+                last = next(
+                    x for x in range(width - 1, -1, -1) if old_row[x * 2 : x * 2 + 2] != new_row[x * 2 : x * 2 + 2]
+                )
+                y0 = y if y0 is None else y0
+                y1 = y
+                x0 = first if x0 is None else min(x0, first)
+                x1 = last if x1 is None else max(x1, last)
+
+        if rects and last_band_y == band_y - band_height:
+            px0, py0, px1, _ = rects[-1]
+            rects[-1] = (min(px0, x0), py0, max(px1, x1), y1)
+        else:
+            rects.append((x0, y0, x1, y1))
+        last_band_y = band_y
+
+    return rects
+
+
+def crop_rgb565(buffer: bytes, width: int, rect) -> bytes:
+    """Returns the pixels of an inclusive rectangle of an RGB565 frame"""
+    x0, y0, x1, y1 = rect
+    stride = width * 2
+    if x0 == 0 and x1 == width - 1:
+        return memoryview(buffer)[y0 * stride : (y1 + 1) * stride]
+    return b"".join(buffer[y * stride + x0 * 2 : y * stride + (x1 + 1) * 2] for y in range(y0, y1 + 1))
@@ -4,34 +4,142 @@
 # Copyright 2011 Álvaro Justen [alvarojusten at gmail dot com]
 # License: GPL <http://www.gnu.org/copyleft/gpl.html>
 
+from collections import OrderedDict
+
 import PIL
 from PIL import Image, ImageDraw, ImageFont
 
+from FontCache import get_font
+from FontMetrics import get_metrics
+
+FIT_CACHE_SIZE = 128
+MAX_FONT_SIZE = 256
+
+# (text, box, font) -> largest fitting font size
+_fit_cache = OrderedDict()
+
+
+def text_width(font_filename, font_size, text):
+    """Advance width of a single line, from the metric tables if possible"""
+    metrics = get_metrics(font_filename, font_size)
+    if metrics is not None:
+        width = metrics.text_width(text)
+        if width is not None:
+            return width
+    return get_font(font_filename, font_size).getlength(text)
+
+
+def line_height(font_filename, font_size):
+    metrics = get_metrics(font_filename, font_size)
+    if metrics is not None:
+        return metrics.line_height
+    return sum(get_font(font_filename, font_size).getmetrics())
+
+
+class TextLayout(object):
+    """Line breaks and positions of a wrapped text box, ready to be drawn"""
+
+    def __init__(self, font_filename, font_size, line_height, box_width):
+        self.font_filename = font_filename
+        self.font_size = font_size
+        self.line_height = line_height
+        self.box_width = box_width
+        self.lines = []  # wrapped lines as text
+        self.line_positions = []  # (x, y) of every line
+        self.runs = []  # (x, y, text) draw calls
+        self.width = 0
+        self.height = 0
+
 
 class ImageText(object):
-    def __init__(self, image, encoding="utf8"):
+    def __init__(self, image, encoding="utf8", atlas=None):
         self.image = image
         self.size = self.image.size
         self.filename = None
         self.draw = ImageDraw.Draw(self.image)
         self.encoding = encoding
+        self.atlas = atlas
+
+    def _draw_text(self, xy, text, font_filename, font_size, color):
+        if self.atlas is not None:
+            self.atlas.draw_text(self.image, xy, text, font_filename, font_size, color)
+        else:
+            font = get_font(font_filename, font_size)
+            self.draw.text(xy, text, font=font, fill=color)
 
     def get_font_size(self, text, font, max_width=None, max_height=None):
         if max_width is None and max_height is None:
             raise ValueError("You need to pass max_width or max_height")
-        font_size = 1
-        text_size = self.get_text_size(font, font_size, text)
-        if (max_width is not None and text_size[0] > max_width) or (
-            max_height is not None and text_size[1] > max_height
-        ):
+        font_size = self.fit_font_size(text, font, max_width, max_height)
+        if font_size is None:
+            text_size = self.get_text_size(font, 1, text)
             raise ValueError("Text can't be filled in only (%dpx, %dpx)" % text_size)
-        while True:
-            if (max_width is not None and text_size[0] >= max_width) or (
-                max_height is not None and text_size[1] >= max_height
-            ):
-                return font_size - 1
-            font_size += 1
-            text_size = self.get_text_size(font, font_size, text)
+        return font_size
+
+    def fit_font_size(
+        self,
+        text,
+        font_filename,
+        max_width=None,
+        max_height=None,
+        wrap=False,
+        min_size=1,
+        max_size=None,
+        line_spacing=1.0,
+    ):
+        """Returns the largest font size in [min_size, max_size] that fits the box.
+
+        With wrap=True the text is wrapped into max_width and the height of the
+        wrapped block is checked. Returns None if not even min_size fits.
+        Results are memoized per (text, box, font)."""
+        if max_width is None and max_height is None:
+            raise ValueError("You need to pass max_width or max_height")
+        if wrap and max_width is None:
+            raise ValueError("You need to pass max_width to wrap the text")
+
+        key = (text, max_width, max_height, wrap, font_filename, min_size, max_size, line_spacing)
+        if key in _fit_cache:
+            _fit_cache.move_to_end(key)
+            return _fit_cache[key]
+
+        def fits(font_size):
+            if wrap:
+                layout = self.layout_text_box(
+                    (0, 0), text, max_width, font_filename, font_size, line_spacing=line_spacing
+                )
+                size = (layout.width, layout.height)
+            else:
+                size = self.get_text_size(font_filename, font_size, text)
+            return (max_width is None or size[0] <= max_width) and (
+                max_height is None or size[1] <= max_height
+            )
+
+        if fits(min_size):
+            low = min_size
+            # without an upper limit, gallop until the text overflows the box
+            if max_size is None:
+                high = low * 2
+                while high < MAX_FONT_SIZE and fits(high):
+                    low, high = high, high * 2
+                high = min(high, MAX_FONT_SIZE)
+            else:
+                high = max_size + 1
+
+            # invariant: low fits, high does not (or is out of range)
+            while high - low > 1:
+                middle = (low + high) // 2
+                if fits(middle):
+                    low = middle
+                else:
+                    high = middle
+            font_size = low
+        else:
+            font_size = None
+
+        _fit_cache[key] = font_size
+        if len(_fit_cache) > FIT_CACHE_SIZE:
+            _fit_cache.popitem(last=False)
+        return font_size
 
     def write_text(
         self,
@@ -47,54 +155,74 @@ class ImageText(object):
         if font_size == "fill" and (max_width is not None or max_height is not None):
             font_size = self.get_font_size(text, font_filename, max_width, max_height)
         text_size = self.get_text_size(font_filename, font_size, text)
-        font = ImageFont.truetype(font_filename, font_size)
         if x == "center":
             x = (self.size[0] - text_size[0]) / 2
         if y == "center":
             y = (self.size[1] - text_size[1]) / 2
-        self.draw.text((x, y), text, font=font, fill=color)
+        self._draw_text((x, y), text, font_filename, font_size, color)
         return text_size
 
     def get_text_size(self, font_filename, font_size, text):
-        total_size = [0, 0]
         lines = text.split("\n")
-        for line in lines:
-            font = ImageFont.truetype(font_filename, font_size)
-            line_size = font.getsize(line)
-            total_size[0] = max(total_size[0], line_size[0])
-            total_size[1] += line_size[1]
-        return tuple(total_size)
+        width = max(text_width(font_filename, font_size, line) for line in lines)
+        return (width, line_height(font_filename, font_size) * len(lines))
 
-    def write_text_box(
+    def layout_text_box(
         self,
         xy,
         text,
         box_width,
         font_filename,
         font_size=11,
-        color=(0, 0, 0),
         place="left",
         justify_last_line=False,
         position="top",
         line_spacing=1.0,
     ):
+        """Wraps text into box_width in a single pass and returns a TextLayout.
+
+        Every word and the space are only measured once, paragraphs
+        (separated by newlines) are stacked below each other."""
         x, y = xy
+        font_height = line_height(font_filename, font_size)
+        text_height = font_height * line_spacing
+        last_line_bleed = text_height - font_height
+
+        widths = {}
+
+        def measure(word):
+            width = widths.get(word)
+            if width is None:
+                width = widths[word] = text_width(font_filename, font_size, word)
+            return width
+
+        space_width = measure(" ")
+
+        # wrap every paragraph, blank lines are kept as empty lines
         lines = []
-        line = []
-        words = text.split()
-        for word in words:
-            new_line = " ".join(line + [word])
-            size = self.get_text_size(font_filename, font_size, new_line)
-            text_height = size[1] * line_spacing
-            last_line_bleed = text_height - size[1]
-            if size[0] <= box_width:
+        for paragraph in text.splitlines():
+            words = paragraph.split()
+            if not words:
+                lines.append(None)
+                continue
+
+            line, line_widths, line_width = [], [], 0
+            for word in words:
+                word_width = measure(word)
+                if line and line_width + space_width + word_width > box_width:
+                    lines.append((line, line_widths, line_width, False))
+                    line, line_widths, line_width = [], [], 0
+                line_width += word_width + (space_width if line else 0)
                 line.append(word)
-            else:
-                lines.append(line)
-                line = [word]
-        if line:
-            lines.append(line)
-        lines = [" ".join(line) for line in lines if line]
+                line_widths.append(word_width)
+            lines.append((line, line_widths, line_width, True))
+
+        layout = TextLayout(font_filename, font_size, text_height, box_width)
+        layout.width = max((line[2] for line in lines if line), default=0)
+
+        # trailing blank lines are not visible
+        while lines and lines[-1] is None:
+            lines.pop()
 
         if position == "middle":
             height = (self.size[1] - len(lines) * text_height + last_line_bleed) / 2
@@ -105,45 +233,43 @@ class ImageText(object):
         else:
             height = y
 
-        for index, line in enumerate(lines):
+        for line in lines:
             height += text_height
-            if place == "left":
-                self.write_text((x, height), line, font_filename, font_size, color)
-            elif place == "right":
-                total_size = self.get_text_size(font_filename, font_size, line)
-                x_left = x + box_width - total_size[0]
-                self.write_text((x_left, height), line, font_filename, font_size, color)
+            if line is None:
+                continue
+
+            words, word_widths, line_width, last_line = line
+            line_text = " ".join(words)
+
+            if place == "right":
+                line_x = x + box_width - line_width
             elif place == "center":
-                total_size = self.get_text_size(font_filename, font_size, line)
-                x_left = int(x + ((box_width - total_size[0]) / 2))
-                self.write_text((x_left, height), line, font_filename, font_size, color)
-            elif place == "justify":
-                words = line.split()
-                if (index == len(lines) - 1 and not justify_last_line) or len(
-                    words
-                ) == 1:
-                    self.write_text((x, height), line, font_filename, font_size, color)
-                    continue
-                line_without_spaces = "".join(words)
-                total_size = self.get_text_size(
-                    font_filename, font_size, line_without_spaces
-                )
-                space_width = (box_width - total_size[0]) / (len(words) - 1.0)
+                line_x = int(x + ((box_width - line_width) / 2))
+            else:
+                line_x = x
+
+            layout.lines.append(line_text)
+            layout.line_positions.append((line_x, height))
+
+            if place == "justify" and not (last_line and not justify_last_line) and len(words) > 1:
+                space = (box_width - sum(word_widths)) / (len(words) - 1.0)
                 start_x = x
-                for word in words[:-1]:
-                    self.write_text(
-                        (start_x, height), word, font_filename, font_size, color
-                    )
-                    word_size = self.get_text_size(font_filename, font_size, word)
-                    start_x += word_size[0] + space_width
-                last_word_size = self.get_text_size(font_filename, font_size, words[-1])
-                last_word_x = x + box_width - last_word_size[0]
-                self.write_text(
-                    (last_word_x, height), words[-1], font_filename, font_size, color
-                )
-        return (box_width, height - y)
+                for word, word_width in zip(words[:-1], word_widths):
+                    layout.runs.append((start_x, height, word))
+                    start_x += word_width + space
+                layout.runs.append((x + box_width - word_widths[-1], height, words[-1]))
+            else:
+                layout.runs.append((line_x, height, line_text))
 
-    def write_multi_line_text_box(
+        layout.height = height - y
+        return layout
+
+    def draw_layout(self, layout, color=(0, 0, 0)):
+        for x, y, text in layout.runs:
+            self._draw_text((x, y), text, layout.font_filename, layout.font_size, color)
+        return (layout.box_width, layout.height)
+
+    def write_text_box(
         self,
         xy,
         text,
@@ -156,27 +282,41 @@ class ImageText(object):
         position="top",
         line_spacing=1.0,
     ):
-        x, y = xy
-        height = 0
-
-        for l in text.splitlines(True):
-            w, h = self.write_text_box(
-                (x, y + height),
-                l,
-                box_width,
-                font_filename,
-                font_size,
-                color,
-                place,
-                justify_last_line,
-                position,
-                line_spacing,
-            )
+        layout = self.layout_text_box(
+            xy,
+            " ".join(text.split()),
+            box_width,
+            font_filename,
+            font_size,
+            place,
+            justify_last_line,
+            position,
+            line_spacing,
+        )
+        return self.draw_layout(layout, color)
 
-            height += h
-            if l == "\n":
-                height += (
-                    self.get_text_size(font_filename, font_size, "dummy")[1]
-                    * line_spacing
-                )
-        return (box_width, height - y)
+    def write_multi_line_text_box(
+        self,
+        xy,
+        text,
+        box_width,
+        font_filename,
+        font_size=11,
+        color=(0, 0, 0),
+        place="left",
+        justify_last_line=False,
+        position="top",
+        line_spacing=1.0,
+    ):
+        layout = self.layout_text_box(
+            xy,
+            text,
+            box_width,
+            font_filename,
+            font_size,
+            place,
+            justify_last_line,
+            position,
+            line_spacing,
+        )
+        return self.draw_layout(layout, color)
@@ -1,23 +1,58 @@
-import adafruit_rgb_display.st7735 as st7735
-import board
-import digitalio
-
-from Messagebox import Messagebox
-
-# Pick your Display
-# see https://github.com/adafruit/Adafruit_CircuitPython_RGB_Display
-display = st7735.ST7735R(
-    spi=board.SPI(),
-    cs=digitalio.DigitalInOut(board.CE0),
-    dc=digitalio.DigitalInOut(board.D24),
-    rst=digitalio.DigitalInOut(board.D25),
-    baudrate=24000000,
-    rotation=90,
-)
+import argparse
+import sys
+
+from const import STARTUP_BUDGET
+from Startup import Startup
+
+
+def create_display():
+    # Pick your Display
+    # see https://github.com/adafruit/Adafruit_CircuitPython_RGB_Display
+    # imported here, the startup sets up the display while it imports the rest
+    import adafruit_rgb_display.st7735 as st7735
+    import board
+    import digitalio
+
+    return st7735.ST7735R(
+        spi=board.SPI(),
+        cs=digitalio.DigitalInOut(board.CE0),
+        dc=digitalio.DigitalInOut(board.D24),
+        rst=digitalio.DigitalInOut(board.D25),
+        baudrate=24000000,
+        rotation=90,
+    )
+
 
 trigger_pin = 26 # Read state trigger (if box is open or closed)
 servo_pin = 17
 
 if __name__ == "__main__":
-    msgBox = Messagebox(display, trigger_pin=trigger_pin, servo_pin=servo_pin)
-    msgBox.run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--asyncio", action="store_true", help="run the states on an asyncio event loop")
+    parser.add_argument(
+        "--startup-profile", action="store_true", help="print import times and the time to the first frame, then exit"
+    )
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        nargs="?",
+        const=STARTUP_BUDGET,
+        help="with --startup-profile: exit with 1 if the first frame took longer (seconds, default %s)" % STARTUP_BUDGET,
+    )
+    args = parser.parse_args()
+
+    startup = Startup()
+    msgBox = startup.run(create_display, trigger_pin=trigger_pin, servo_pin=servo_pin)
+
+    if args.startup_profile:
+        startup.wait_first_frame(30)
+        print(startup.report())
+        if args.startup_budget is not None and (startup.first_frame is None or startup.first_frame > args.startup_budget):
+            print("First frame over the budget of %.2fs" % args.startup_budget)
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.asyncio:
+        msgBox.run_async()
+    else:
+        msgBox.run()